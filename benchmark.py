@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Time every script in this directory on a source tree, such as one
+# generated by gentree.py, and report how fast each one is. None of the
+# scripts are run with --fix, so the tree isn't changed.
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+import gentree
+import treewalk
+
+
+scriptDirectory = os.path.dirname(os.path.abspath(__file__))
+
+# For each script, the extra arguments to run it with, and the files it
+# looks at: the extensions, the subdirectory, the file name if it only
+# looks at one, and the directory names it doesn't descend into. These
+# are only used to count the files and bytes, so they don't need to
+# match the scripts exactly.
+tools = [
+    ("modeline.py", ["--keep-going"], [".h", ".cpp", ".cc"], "", None, treewalk.vcsDirNames),
+    ("builtin.py", [], [".sys.mjs", ".jsm", ".js", ".xhtml", ".html", ".sjs", ".idl"], "", None,
+     treewalk.vcsDirNames | treewalk.thirdPartyDirNames),
+    ("decomponents.py", [], [".js", ".jsm", ".html", ".py", ".xhtml", ".xul"], "", None,
+     treewalk.vcsDirNames),
+    ("remove.py", [], [".cpp"], "", None, treewalk.vcsDirNames),
+    ("replacer.py", [], [".cpp", ".h", ".cc", ".mm"], "", None, treewalk.vcsDirNames),
+    ("refptrinclude.py", [], [".h", ".cpp"], "", None, treewalk.vcsDirNames),
+    ("td_alias_remove.py", [], [".h", ".cpp"], "", None, treewalk.vcsDirNames),
+    ("wptini.py", [], [".ini"], "testing/web-platform/meta", "__dir__.ini", treewalk.vcsDirNames),
+]
+
+
+# Returns the number of files and bytes a script will look at.
+def measureInput(directory, extensions, subdirectory, onlyFileName, prunedDirNames):
+    fileCount = 0
+    byteCount = 0
+    for (base, fileName, _) in treewalk.walk(directory + subdirectory, extensions,
+                                             prunedDirNames=prunedDirNames):
+        if onlyFileName and fileName != onlyFileName:
+            continue
+        fileCount += 1
+        byteCount += os.stat(base + fileName).st_size
+    return (fileCount, byteCount)
+
+
+# Run a script, returning the best wall clock time out of |repeat| runs
+# and the exit code of the last one.
+def timeTool(args, script, extraArgs, directory):
+    command = [args.python, os.path.join(scriptDirectory, script), directory] + extraArgs
+    best = None
+    returnCode = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        returnCode = subprocess.run(command, stdout=subprocess.DEVNULL).returncode
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return (best, returnCode)
+
+
+parser = argparse.ArgumentParser(description='Benchmark the scripts in this directory.')
+parser.add_argument('directory', metavar='D',
+                    help='Full path of the source tree to run the scripts on')
+
+parser.add_argument('--generate', dest='generateFiles', type=int, metavar='N',
+                    help='First generate a tree of about N files in the directory with gentree.py')
+
+parser.add_argument('--tool', dest='tools', action='append', metavar='SCRIPT',
+                    help='Only run this script. Can be given more than once.')
+
+parser.add_argument('--repeat', dest='repeat', type=int, default=3,
+                    help='Number of times to run each script, keeping the best time')
+
+parser.add_argument('--python', dest='python', default=sys.executable,
+                    help='Python interpreter to run the scripts with')
+
+parser.add_argument('--save', dest='saveFile',
+                    help='Save the results to this JSON file')
+
+parser.add_argument('--compare', dest='compareFile',
+                    help='Compare the results against ones saved with --save')
+
+args = parser.parse_args()
+
+directory = os.path.abspath(args.directory) + "/"
+
+if args.generateFiles:
+    if os.path.exists(directory) and os.listdir(directory):
+        print('Directory', directory, 'is not empty.')
+        exit(-1)
+    gentree.generate(directory, args.generateFiles, 5, 1)
+
+baseline = {}
+if args.compareFile:
+    with open(args.compareFile) as f:
+        baseline = json.load(f)
+
+results = {}
+print('%-20s %6s %8s %10s %8s %9s %6s' % ('script', 'files', 'MB', 'seconds', 'files/s', 'MB/s', 'exit'))
+for (script, extraArgs, extensions, subdirectory, onlyFileName, prunedDirNames) in tools:
+    if args.tools and script not in args.tools:
+        continue
+    (fileCount, byteCount) = measureInput(directory, extensions, subdirectory, onlyFileName, prunedDirNames)
+    (elapsed, returnCode) = timeTool(args, script, extraArgs, directory)
+    results[script] = {'files': fileCount, 'bytes': byteCount, 'seconds': elapsed, 'exit': returnCode}
+
+    line = '%-20s %6d %8.1f %10.3f %8.0f %9.2f %6d' % (script, fileCount, byteCount / 1e6, elapsed,
+                                                     fileCount / elapsed, byteCount / elapsed / 1e6,
+                                                     returnCode)
+    if script in baseline:
+        line += '  %.2fx' % (baseline[script]['seconds'] / elapsed)
+    print(line)
+
+if args.saveFile:
+    with open(args.saveFile, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
@@ -7,9 +7,23 @@
 # The idea of this script is to find interfaces that are not
 # implemented in JS, but not marked builtinclass.
 
-import re
+import io
 import os
+import re
+import json
+import mmap
+import time
+import hashlib
+import sqlite3
 import argparse
+import functools
+import threading
+import socketserver
+import multiprocessing
+import concurrent.futures
+
+import runstats
+import treewalk
 
 
 okayInterfacePatt = re.compile("^nsI|xpcI|mozI|nsPI|imgI|rrI|amI|txI|IPeer")
@@ -32,13 +46,46 @@ def assertInterfaceOkay(fname, interface):
 # Searching for the entire ChromeUtils.generateQI seems reasonable:
 # https://searchfox.org/mozilla-central/search?q=%5B%5Es%5D.generateqi&path=&case=false&regexp=true
 
+# Only a small fraction of files mention generateQI at all, so search
+# the raw bytes of each file for this before looking at any lines.
+qiPrefilter = b"generateQI"
+
+# Returns the contents of file |fname| from the start of the line that
+# first contains |qiPrefilter|, or None if it doesn't contain it.
+def generateQITail(fname):
+    with open(fname, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files can't be mapped.
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            hit = m.find(qiPrefilter)
+            if hit == -1:
+                return None
+            return m[m.rfind(b"\n", 0, hit) + 1:]
+
+
 # Look for calls to ChromeUtils.generateQI and add any interfaces found to the
 # set |jsImplementedInterfaces|.
-def generateQIFinder(args, fname, jsImplementedInterfaces):
-    f = open(fname, "r")
+def generateQIFinder(args, fname, jsImplementedInterfaces, stats):
+    with stats.phase('read'):
+        data = generateQITail(fname)
+    if data is None:
+        stats.count('prefiltered')
+        return
+    stats.addBytes('read', len(data))
+
+    # Interface names are ASCII, so decode as latin-1 to accept any file.
+    # Like reading the file as text, this translates all line endings.
+    text = data.decode("latin-1")
+    with stats.phase('generateQI', len(text)):
+        generateQILines(fname, io.StringIO(text, newline=None), jsImplementedInterfaces)
+
+
+# Look for generateQI calls in the lines of file |fname|.
+def generateQILines(fname, lines, jsImplementedInterfaces):
     qiArgString = None
 
-    for l in f:
+    for l in lines:
         l = l.strip()
 
         # Skip lines that are comments or are probably part of comments.
@@ -91,17 +138,27 @@ def generateQIFinder(args, fname, jsImplementedInterfaces):
 
         qiArgString = None
 
-    f.close()
-
 
 forwardDeclPatt = re.compile("^interface [A-Za-z0-9_-]+;$")
 
-# Look at XPIDL files for interfaces that are implementable by JS.
-def idlFileAnalyzer(args, fname, maybeBuiltinables):
-    f = open(fname, "r")
+# Look at XPIDL files for interfaces that are implementable by JS. A tuple
+# of the name, whether it is scriptable, builtinclass or a function, and
+# the UUID is added to the list |interfaces| for each interface.
+def idlFileAnalyzer(args, fname, interfaces, stats):
+    with stats.phase('read'):
+        with open(fname, "r", encoding="latin-1") as f:
+            data = f.read()
+    stats.addBytes('read', len(data))
+
+    with stats.phase('idl', len(data)):
+        idlLines(fname, io.StringIO(data), interfaces)
+
+
+# Look for interfaces in the lines of XPIDL file |fname|.
+def idlLines(fname, lines, interfaces):
     prevLine = None
 
-    for l in f:
+    for l in lines:
         l = l.strip()
         if l.startswith("//"):
             continue
@@ -121,6 +178,7 @@ def idlFileAnalyzer(args, fname, maybeBuiltinables):
         builtinClass = False
         function = False
         anyUUID = False
+        uuid = None
         for a in attributes:
             if a == 'scriptable':
                 scriptable = True
@@ -133,25 +191,225 @@ def idlFileAnalyzer(args, fname, maybeBuiltinables):
             if a.startswith('uuid'):
                 assert not anyUUID
                 anyUUID = True
+                uuid = a[len('uuid'):].strip("() ")
                 continue
         if not anyUUID:
-            print fname, prevLine
+            print(fname, prevLine)
         # Assert we found a UUID to guard against bugs in our crude parser.
         assert anyUUID
 
         # It doesn't make sense to mark non-scriptable interfaces builtinclass.
         assert scriptable or not builtinClass
 
-        # If something isn't scriptable, we don't want to make it builtinclass.
-        # If something is already builtinclass, we don't want to make it builtinclass.
-        # If something is a function, we can't analyze whether it is used by JS.
-        if scriptable and not builtinClass and not function:
-            maybeBuiltinables.setdefault(interface, []).append(fname)
-
-
-    f.close()
-
-
+        interfaces.append((interface, scriptable, builtinClass, function, uuid))
+
+
+# If something isn't scriptable, we don't want to make it builtinclass.
+# If something is already builtinclass, we don't want to make it builtinclass.
+# If something is a function, we can't analyze whether it is used by JS.
+def isMaybeBuiltinable(scriptable, builtinClass, function):
+    return scriptable and not builtinClass and not function
+
+
+# The index is a SQLite database of the interfaces defined in each XPIDL
+# file and the interfaces passed to generateQI in each JS file, along
+# with the modification time, size and hash of each file, so that only
+# files that have changed need to be parsed again. Bump this when the
+# schema or what gets parsed changes, to rebuild the index.
+indexVersion = 1
+
+indexSchema = """
+DROP TABLE IF EXISTS files;
+DROP TABLE IF EXISTS interfaces;
+DROP TABLE IF EXISTS generateqi;
+CREATE TABLE files (path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, hash TEXT);
+CREATE TABLE interfaces (name TEXT, file TEXT, scriptable INTEGER, builtinclass INTEGER,
+                         function INTEGER, uuid TEXT);
+CREATE INDEX interfacesByFile ON interfaces (file);
+CREATE TABLE generateqi (file TEXT, interface TEXT);
+CREATE INDEX generateqiByFile ON generateqi (file);
+CREATE INDEX generateqiByInterface ON generateqi (interface);
+"""
+
+def openIndex(indexFile):
+    index = sqlite3.connect(indexFile)
+    if index.execute("PRAGMA user_version").fetchone()[0] != indexVersion:
+        index.executescript(indexSchema)
+        index.execute("PRAGMA user_version = %d" % indexVersion)
+    return index
+
+
+def fileHash(fname):
+    with open(fname, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def forgetFile(index, fname):
+    index.execute("DELETE FROM interfaces WHERE file = ?", (fname,))
+    index.execute("DELETE FROM generateqi WHERE file = ?", (fname,))
+
+
+# Update the index entries for a file, if the file has changed since it
+# was indexed. |known| maps file names to their (mtime, size, hash) in
+# the index. Returns whether the file had to be parsed again.
+def indexFile(args, index, known, fname, extension, stats):
+    st = os.stat(fname)
+    old = known.get(fname)
+    if old and old[0] == st.st_mtime_ns and old[1] == st.st_size:
+        stats.count('unchanged')
+        return False
+
+    with stats.phase('hash', st.st_size):
+        h = fileHash(fname)
+    if old and old[2] == h:
+        # Only the modification time changed, like after a checkout.
+        index.execute("UPDATE files SET mtime = ? WHERE path = ?", (st.st_mtime_ns, fname))
+        stats.count('unchanged')
+        return False
+
+    stats.count('analyzed')
+    forgetFile(index, fname)
+    with stats.file(fname, st.st_size):
+        if extension == ".idl":
+            interfaces = []
+            idlFileAnalyzer(args, fname, interfaces, stats)
+            index.executemany("INSERT INTO interfaces VALUES (?, ?, ?, ?, ?, ?)",
+                              [(i, fname, s, b, f, u) for (i, s, b, f, u) in interfaces])
+        else:
+            qi = set()
+            generateQIFinder(args, fname, qi, stats)
+            index.executemany("INSERT INTO generateqi VALUES (?, ?)", [(fname, i) for i in sorted(qi)])
+    index.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                  (fname, st.st_mtime_ns, st.st_size, h))
+    return True
+
+
+# Bring the index up to date with the files in |fileNames|. If that isn't
+# all of the files, because only files changed since some revision are
+# being looked at, other files are only removed from the index if they
+# no longer exist. Returns whether any interfaces or generateQI calls
+# might have changed.
+def updateIndex(args, index, fileNames, stats):
+    known = {}
+    for (path, mtime, size, h) in index.execute("SELECT path, mtime, size, hash FROM files"):
+        known[path] = (mtime, size, h)
+
+    changed = False
+    seen = set()
+    for (fname, extension) in fileNames:
+        seen.add(fname)
+        if indexFile(args, index, known, fname, extension, stats):
+            changed = True
+
+    for fname in known:
+        if fname in seen:
+            continue
+        if args.changedSince and os.path.exists(fname):
+            continue
+        stats.count('removed')
+        forgetFile(index, fname)
+        index.execute("DELETE FROM files WHERE path = ?", (fname,))
+        changed = True
+
+    index.commit()
+    return changed
+
+
+# Returns a dict mapping each interface that might be markable as
+# builtinclass to the list of files it is defined in.
+def indexedBuiltinables(index):
+    # This is the same test as isMaybeBuiltinable.
+    rows = index.execute("""SELECT name, file FROM interfaces
+                            WHERE scriptable AND NOT builtinclass AND NOT function
+                            AND name NOT IN (SELECT interface FROM generateqi)
+                            ORDER BY rowid""")
+    maybeBuiltinables = {}
+    for (interface, fname) in rows:
+        maybeBuiltinables.setdefault(interface, []).append(fname)
+    return maybeBuiltinables
+
+
+def indexedJSImplemented(index):
+    return set(row[0] for row in index.execute("SELECT DISTINCT interface FROM generateqi"))
+
+
+# Load everything in the index that --serve needs to answer queries.
+# Returns a dict mapping interface names to their definitions, and a
+# dict mapping them to the JS files that pass them to generateQI.
+def loadIndex(index):
+    definitions = {}
+    for (name, fname, scriptable, builtinClass, function, uuid) in index.execute(
+            "SELECT name, file, scriptable, builtinclass, function, uuid FROM interfaces ORDER BY rowid"):
+        definitions.setdefault(name, []).append({'file': fname,
+                                                 'scriptable': bool(scriptable),
+                                                 'builtinclass': bool(builtinClass),
+                                                 'function': bool(function),
+                                                 'uuid': uuid})
+    implementers = {}
+    for (fname, interface) in index.execute("SELECT file, interface FROM generateqi ORDER BY file"):
+        implementers.setdefault(interface, []).append(fname)
+    return (definitions, implementers)
+
+
+def interfaceInfo(interfaceData, interface):
+    (definitions, implementers) = interfaceData
+    defs = definitions.get(interface, [])
+    jsFiles = implementers.get(interface, [])
+    builtinable = bool(defs) and not jsFiles and all(
+        isMaybeBuiltinable(d['scriptable'], d['builtinclass'], d['function']) for d in defs)
+    return {'interface': interface, 'definitions': defs, 'implementedInJS': jsFiles,
+            'builtinclassable': builtinable}
+
+
+# Each request is a line with an interface name, and each reply is a line
+# of JSON with what the index knows about it.
+class QueryHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            interface = line.decode("latin-1").strip()
+            if not interface:
+                continue
+            reply = interfaceInfo(self.server.interfaceData, interface)
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+            self.wfile.flush()
+
+
+# Keep the index up to date by looking for changed files every
+# |args.pollInterval| seconds, and give the server the new data.
+def pollIndex(args, server):
+    while True:
+        time.sleep(args.pollInterval)
+        index = openIndex(args.indexFile)
+        try:
+            if updateIndex(args, index, sourceFiles(args, runstats.disabled), runstats.disabled):
+                server.interfaceData = loadIndex(index)
+                print("Reloaded the index", flush=True)
+        except Exception as e:
+            # Keep answering queries with the old data until the file
+            # is fixed.
+            print("Failed to update the index:", e, flush=True)
+        finally:
+            index.close()
+
+
+# Answer queries about interfaces on a Unix socket until interrupted.
+def serve(args, index):
+    if os.path.exists(args.serveSocket):
+        os.remove(args.serveSocket)
+    server = socketserver.ThreadingUnixStreamServer(args.serveSocket, QueryHandler)
+    server.daemon_threads = True
+    server.interfaceData = loadIndex(index)
+    index.close()
+
+    threading.Thread(target=pollIndex, args=(args, server), daemon=True).start()
+    print("Serving queries on", args.serveSocket, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(args.serveSocket)
 
 
 parser = argparse.ArgumentParser(description='Find XPIDL interfaces that could be marked builtinclass')
@@ -161,70 +419,155 @@ parser.add_argument('directory', metavar='D',
 parser.add_argument('--showdir', dest='showDir', action='store_true',
                     help='show the directory the IDL file is located in')
 
-args = parser.parse_args()
+parser.add_argument('--save-snapshot', dest='saveSnapshot', metavar='FILE',
+                    help='Save the results to this file, for use with --since-snapshot')
 
-jsImplementedInterfaces = set([])
-maybeBuiltinables = {}
+parser.add_argument('--since-snapshot', dest='sinceSnapshot', metavar='FILE',
+                    help='Only report interfaces that became or stopped being markable since this snapshot')
 
-validExtensions = [".sys.mjs", ".jsm", ".js", ".xhtml", ".html", ".sjs", ".idl"]
-validFileRe = re.compile("^.*(?:" + '|'.join(map(lambda e: "(?:" + re.escape(e) + ")", validExtensions)) + ")$")
+parser.add_argument('--index', dest='indexFile',
+                    help='Keep the parsed interfaces and generateQI calls in this SQLite file, and only parse files that changed')
 
-for (base, _, files) in os.walk(args.directory):
-    for fileName in files:
-        # Using a regexp seems like it is slightly slower but whatever.
-        if not(validFileRe.match(fileName)):
-            continue
+parser.add_argument('--no-update', dest='noUpdate', action='store_true',
+                    help='Report from the index without looking for changed files')
 
-        #if fileName.endswith('.cpp') or fileName.endswith('.h') or fileName.endswith('~'):
-        #    continue
+parser.add_argument('--jobs', '-j', dest='jobs', type=int, default=1,
+                    help='Number of processes to analyze files with')
 
-        # XXX Hacky way to not process files in the objdir.
-        if "obj-" in base:
-            continue
+parser.add_argument('--serve', dest='serveSocket', metavar='SOCKET',
+                    help='Answer builtinquery.py queries on this Unix socket, using and updating the index')
 
-        if ".git" in base or ".hg" in base:
-            continue
+parser.add_argument('--poll', dest='pollInterval', type=float, default=10, metavar='SECONDS',
+                    help='How often --serve looks for changed files')
 
-        # Some eslint files deal with generateQI, so just ignore them.
-        if "tools/lint/eslint/" in base:
-            continue
+treewalk.addArguments(parser)
+runstats.addArguments(parser)
 
-        # There are a lot of these files, and they don't use generateQI.
-        if "testing/web-platform/" in base:
-            continue
-        if "js/src/tests/" in base:
-            continue
+args = parser.parse_args()
+stats = runstats.fromArgs(args)
 
-        # These files contain a false positive generateQI, from a commit message.
-        if fileName == ".hg-annotate-ignore-revs":
-            continue
-        if fileName == ".git-blame-ignore-revs":
-            continue
+if args.noUpdate and not args.indexFile:
+    parser.error('--no-update requires --index')
+if args.jobs > 1 and args.indexFile:
+    parser.error('--jobs can not be used with --index')
+if args.serveSocket and not args.indexFile:
+    parser.error('--serve requires --index')
 
-        if not base.endswith("/"):
-            base += "/"
+if args.changedSince and not args.indexFile:
+    print("Only looking at files changed since " + args.changedSince + ", so this is not a complete analysis.")
+
+jsImplementedInterfaces = set([])
+maybeBuiltinables = {}
+
+validExtensions = [".sys.mjs", ".jsm", ".js", ".xhtml", ".html", ".sjs", ".idl"]
+
+# Directories that have a lot of files that don't use generateQI, or
+# that contain false positives.
+prunedDirs = [
+    # Some eslint files deal with generateQI, so just ignore them.
+    "tools/lint/eslint/",
+    "testing/web-platform/",
+    "js/src/tests/",
+]
+
+def pruneDir(path):
+    return path.endswith(tuple(prunedDirs))
+
+# Some files with the .idl extension aren't XPIDL.
+def notXPIDL(base, fullFileName):
+    # This is a WebIDL-ish file.
+    if fullFileName.endswith("toolkit/components/translation/cld2/cld.idl"):
+        return True
+    # Some accessible subdirectories contains some Windows IDL files with the .idl extension.
+    if "accessible/ipc/win/" in base:
+        return True
+    if "accessible/interfaces/" in fullFileName:
+        if "/msaa" in fullFileName or "/gecko" in fullFileName or "/ia2" in fullFileName:
+            return True
+    return False
+
+# Third party code is unlikely to use XPIDL, and it contains some false positives.
+prunedDirNames = treewalk.vcsDirNames | treewalk.thirdPartyDirNames
+
+# Yields the name and extension of each file to analyze.
+def sourceFiles(args, stats):
+    allFiles = treewalk.files(args, args.directory, validExtensions, pruneDir, prunedDirNames)
+    for (base, fileName, extension) in stats.timedIterator('walk', allFiles):
         fullFileName = base + fileName
+        stats.count('seen')
 
-        # Third party code is unlikely to use XPIDL, and it contains some false positives.
-        if "/third_party/" in fullFileName:
-            continue
-        if "/other-licenses/" in fullFileName:
+        if extension == ".idl" and notXPIDL(base, fullFileName):
+            stats.count('skipped')
             continue
 
-        if fileName.endswith(".idl"):
-            # This is a WebIDL-ish file.
-            if fullFileName.endswith("toolkit/components/translation/cld2/cld.idl"):
-                continue
-            # Some accessible subdirectories contains some Windows IDL files with the .idl extension.
-            if "accessible/ipc/win/" in base:
-                continue
-            if "accessible/interfaces/" in fullFileName:
-                if "/msaa" in fullFileName or "/gecko" in fullFileName or "/ia2" in fullFileName:
-                    continue
+        yield (fullFileName, extension)
 
-            idlFileAnalyzer(args, fullFileName, maybeBuiltinables)
+
+# Analyze a single file, adding its results to |maybeBuiltinables| or
+# |jsImplementedInterfaces|.
+def analyzeFile(args, fullFileName, extension, maybeBuiltinables, jsImplementedInterfaces, stats):
+    stats.count('analyzed')
+    with stats.file(fullFileName):
+        if extension == ".idl":
+            interfaces = []
+            idlFileAnalyzer(args, fullFileName, interfaces, stats)
+            for (interface, scriptable, builtinClass, function, _) in interfaces:
+                if isMaybeBuiltinable(scriptable, builtinClass, function):
+                    maybeBuiltinables.setdefault(interface, []).append(fullFileName)
         else:
-            generateQIFinder(args, fullFileName, jsImplementedInterfaces)
+            generateQIFinder(args, fullFileName, jsImplementedInterfaces, stats)
+
+
+# Analyze a list of files in a worker process. Returns the partial
+# maybeBuiltinables and jsImplementedInterfaces for them, and their stats
+# if --stats was given.
+def analyzeChunk(args, chunk):
+    stats = runstats.Stats(args.slowFileCount) if args.stats else runstats.disabled
+    maybeBuiltinables = {}
+    jsImplementedInterfaces = set()
+    for (fullFileName, extension) in chunk:
+        analyzeFile(args, fullFileName, extension, maybeBuiltinables, jsImplementedInterfaces, stats)
+    return (maybeBuiltinables, jsImplementedInterfaces, stats if args.stats else None)
+
+
+# Split the files into a few chunks per process, to even out the work.
+# The chunks are contiguous, so merging them in order gives the same
+# results as a serial run.
+def chunkFiles(files, jobs):
+    chunkSize = max(1, -(-len(files) // (jobs * 4)))
+    return [files[i:i + chunkSize] for i in range(0, len(files), chunkSize)]
+
+
+if args.indexFile:
+    index = openIndex(args.indexFile)
+    if not args.noUpdate:
+        updateIndex(args, index, sourceFiles(args, stats), stats)
+    if args.serveSocket:
+        serve(args, index)
+        exit()
+    with stats.phase('query'):
+        # The query leaves out interfaces that are implemented in JS.
+        maybeBuiltinables = indexedBuiltinables(index)
+        jsImplementedInterfaces = indexedJSImplemented(index)
+    index.close()
+elif args.jobs > 1:
+    chunks = chunkFiles(list(sourceFiles(args, stats)), args.jobs)
+    # This script runs at the top level, so the workers have to be forked
+    # rather than started from scratch.
+    executor = concurrent.futures.ProcessPoolExecutor(args.jobs, mp_context=multiprocessing.get_context("fork"))
+    try:
+        # An exception from a worker, like for a bad interface, is raised
+        # again here.
+        for (partialBuiltinables, partialImplemented, chunkStats) in executor.map(functools.partial(analyzeChunk, args), chunks):
+            for (interface, fnames) in partialBuiltinables.items():
+                maybeBuiltinables.setdefault(interface, []).extend(fnames)
+            jsImplementedInterfaces |= partialImplemented
+            stats.merge(chunkStats)
+    finally:
+        executor.shutdown(cancel_futures=True)
+else:
+    for (fullFileName, extension) in sourceFiles(args, stats):
+        analyzeFile(args, fullFileName, extension, maybeBuiltinables, jsImplementedInterfaces, stats)
 
 # XXX Also need to take into account the handful of do_ImportModule interfaces.
 
@@ -235,21 +578,44 @@ for (base, _, files) in os.walk(args.directory):
 
 builtinClassable = set(maybeBuiltinables.keys()) - jsImplementedInterfaces
 
-
-if not args.showDir:
-    output = list(builtinClassable)
+# The IDL files each candidate is defined in, relative to the directory.
+baseDirLen = len(args.directory)
+candidateFiles = {}
+for i in builtinClassable:
+    candidateFiles[i] = [baseIdir[baseDirLen:] for baseIdir in maybeBuiltinables[i]]
+
+
+def printInterfaces(title, interfaces, interfaceFiles):
+    if not args.showDir:
+        output = list(interfaces)
+    else:
+        output = []
+        for i in interfaces:
+            for idir in interfaceFiles[i]:
+                idir = idir[:idir.rfind("/")]
+                output.append(idir + " " + i)
+
+    output.sort()
+    print(title)
+    for i in output:
+        print(i)
+    print()
+
+
+if args.sinceSnapshot:
+    with open(args.sinceSnapshot, "r") as f:
+        oldSnapshot = json.load(f)
+    oldCandidates = oldSnapshot['candidates']
+    printInterfaces("Interfaces that became markable as builtinclass since the snapshot:",
+                    builtinClassable - set(oldCandidates), candidateFiles)
+    printInterfaces("Interfaces that are no longer markable as builtinclass since the snapshot:",
+                    set(oldCandidates) - builtinClassable, oldCandidates)
 else:
-    baseDirLen = len(args.directory)
-    output = []
-    for i in builtinClassable:
-        for baseIdir in maybeBuiltinables[i]:
-            idir = baseIdir[baseDirLen:]
-            idir = idir[:idir.rfind("/")]
-            output.append(idir + " " + i)
-
-
-output.sort()
-print "Interfaces that might be markable as builtinclass:"
-for i in output:
-    print i
-print
+    printInterfaces("Interfaces that might be markable as builtinclass:", builtinClassable, candidateFiles)
+
+if args.saveSnapshot:
+    snapshot = {'candidates': candidateFiles,
+                'jsImplemented': sorted(jsImplementedInterfaces)}
+    with open(args.saveSnapshot + ".intermediate", "w") as f:
+        json.dump(snapshot, f, sort_keys=True)
+    os.replace(args.saveSnapshot + ".intermediate", args.saveSnapshot)
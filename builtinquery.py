@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Ask a builtin.py --serve process whether interfaces can be marked
+# builtinclass.
+
+import json
+import socket
+import argparse
+
+
+def describe(info):
+    interface = info['interface']
+    if not info['definitions']:
+        print(interface + ': not defined in any XPIDL file')
+        return
+
+    if info['builtinclassable']:
+        print(interface + ': can be marked builtinclass')
+    elif info['implementedInJS']:
+        print(interface + ': implemented in JS')
+    else:
+        print(interface + ': can not be marked builtinclass')
+
+    for d in info['definitions']:
+        attributes = [a for a in ['scriptable', 'builtinclass', 'function'] if d[a]]
+        attributes.append('uuid(' + d['uuid'] + ')')
+        print('    defined in', d['file'], '[' + ', '.join(attributes) + ']')
+    for f in info['implementedInJS']:
+        print('    passed to generateQI in', f)
+
+
+parser = argparse.ArgumentParser(description='Query builtin.py --serve about interfaces.')
+parser.add_argument('socket', metavar='SOCKET',
+                    help='Unix socket that builtin.py --serve is listening on')
+parser.add_argument('interfaces', metavar='INTERFACE', nargs='+',
+                    help='Interfaces to ask about')
+
+parser.add_argument('--json', dest='json', action='store_true',
+                    help='Print the replies as JSON')
+
+args = parser.parse_args()
+
+s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+try:
+    s.connect(args.socket)
+except OSError as e:
+    print('Could not connect to', args.socket + ':', e.strerror)
+    exit(-1)
+
+f = s.makefile("rwb")
+for interface in args.interfaces:
+    f.write(interface.encode("latin-1") + b"\n")
+f.flush()
+
+for _ in args.interfaces:
+    info = json.loads(f.readline())
+    if args.json:
+        print(json.dumps(info))
+    else:
+        describe(info)
+
+f.close()
+s.close()
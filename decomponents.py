@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
@@ -6,22 +6,94 @@
 
 # Components remover.
 
+import io
 import re
 import os
+import sys
+import difflib
 import argparse
 
+import treewalk
+
 # let Cu = Components.utils;
 ciPatt = re.compile("^\s*(const|let|var)\s+(Cc|Ci|Cr|Cu)\s*=\s*Components.(classes|interfaces|results|utils)\s*;\s*$")
 
-# const { utils: Cu, interfaces: Ci, classes: Cc, results: Cr } = Components;
-fieldPatt = "\w+\s*:\s*\w+\s*"
-bodyPatt = fieldPatt + "(?:,\s*" + fieldPatt + ")*"
-destructurePatt = re.compile("^(\s*(?:const|let|var))\s*(\{\s*)(" + bodyPatt + ")\}\s*=\s*Components\s*;\s*$")
-
-whiteSpacePatt = re.compile("^\s*$")
+# Only lines that contain this word can match either kind of line, so
+# nothing else is matched at all.
+componentsWord = "Components"
 
 matchDestructure = True
 
+# Each of these matches a single run of characters, so they can't
+# backtrack.
+spacePatt = re.compile(r"\s*")
+wordPatt = re.compile(r"\w*")
+
+def skipSpace(l, i):
+    return spacePatt.match(l, i).end()
+
+def skipWord(l, i):
+    return wordPatt.match(l, i).end()
+
+destructureKeywords = ("const", "let", "var")
+
+# Match a line like this, returning the declaration, the opening bracket
+# with the whitespace after it, and the fields with the whitespace after
+# them, or None if the line is anything else:
+#   const { utils: Cu, interfaces: Ci, classes: Cc, results: Cr } = Components;
+# This matches the same lines as this regexp, but it looks at each
+# character once, so that long lines of minified or generated code that
+# almost match can't make it slow:
+#   ^(\s*(?:const|let|var))\s*(\{\s*)(\w+\s*:\s*\w+\s*(?:,\s*\w+\s*:\s*\w+\s*)*)\}\s*=\s*Components\s*;\s*$
+def scanDestructure(l):
+    i = skipSpace(l, 0)
+    if not l.startswith(destructureKeywords, i):
+        return None
+    i += 3 if l[i] != "c" else 5
+    prefixEnd = i
+
+    i = skipSpace(l, i)
+    if not l.startswith("{", i):
+        return None
+    bracketStart = i
+    i = skipSpace(l, i + 1)
+    bodyStart = i
+
+    # One or more name: value pairs, separated by commas.
+    while True:
+        j = skipWord(l, i)
+        if j == i:
+            return None
+        i = skipSpace(l, j)
+        if not l.startswith(":", i):
+            return None
+        i = skipSpace(l, i + 1)
+        j = skipWord(l, i)
+        if j == i:
+            return None
+        i = skipSpace(l, j)
+        if not l.startswith(",", i):
+            break
+        i = skipSpace(l, i + 1)
+
+    if not l.startswith("}", i):
+        return None
+    bodyEnd = i
+
+    i = skipSpace(l, i + 1)
+    if not l.startswith("=", i):
+        return None
+    i = skipSpace(l, i + 1)
+    if not l.startswith(componentsWord, i):
+        return None
+    i = skipSpace(l, i + len(componentsWord))
+    if not l.startswith(";", i):
+        return None
+    if skipSpace(l, i + 1) != len(l):
+        return None
+
+    return (l[:prefixEnd], l[bracketStart:bodyStart], l[bodyStart:bodyEnd])
+
 def extractFieldVals(prefix, bracketPrefix, s):
     removedAny = False
     first = None
@@ -80,100 +152,141 @@ def extractFieldVals(prefix, bracketPrefix, s):
 #   { at the end of the line for blocks in JS
 #   <![CDATA[ at the end of a line
 #   """ and ''' at the end of the line for Python with embedded JS.
-blockStartPatt = re.compile("(?:^//)|(?:^.*(?:\*/|\{|\<\!\[CDATA\[|\"\"\"|''')\n$)")
-
-def fileAnalyzer(args, fname):
-    f = open(fname, "r")
+blockStart = "//"
+blockEnds = tuple(e + n for e in ("*/", "{", "<![CDATA[", '"""', "'''") for n in ("\n", "\r\n"))
+
+# Write a unified diff from |oldLines| to |newLines| for the file at
+# |path|, relative to the top of the tree, that git apply can use.
+def writePatch(patchFile, path, oldLines, newLines):
+    for l in difflib.unified_diff(oldLines, newLines, "a/" + path, "b/" + path):
+        patchFile.write(l)
+        if not l.endswith("\n"):
+            patchFile.write("\n\\ No newline at end of file\n")
+
+# Remove the definitions from a file. With --fix, the file is rewritten
+# if anything was removed, and with --emit-patch, a diff of what --fix
+# would do is written to |patchFile| instead.
+def fileAnalyzer(args, fname, relativeName, patchFile, messageFile):
+    with open(fname, "rb") as f:
+        data = f.read()
+
+    # A file that never mentions Components has nothing to remove.
+    if componentsWord.encode() not in data:
+        return
+
+    # Decode the same way as opening the file as text would, but keep
+    # the line endings as they are, so that --fix doesn't change them.
+    f = io.TextIOWrapper(io.BytesIO(data), newline="")
+    lines = f.readlines()
+    f.close()
     anyFixes = False
     prevNotRemovedLineBlank = True
     removedLastLine = False
 
-    if args.fixFiles:
-        newFile = open(fname + ".intermediate", "w")
+    editing = args.fixFiles or patchFile
+    newLines = []
 
-    for l in f:
-        if ciPatt.match(l):
-            print("Skipping simple Ci match in " + fname)
+    for l in lines:
+        hasComponents = componentsWord in l
+
+        if hasComponents and ciPatt.match(l):
+            print("Skipping simple Ci match in " + fname, file=messageFile)
             anyFixes = True
             removedLastLine = True
             continue
 
-        if matchDestructure:
-            deMatch = destructurePatt.match(l)
+        if hasComponents and matchDestructure:
+            deMatch = scanDestructure(l)
             if deMatch:
-                x = extractFieldVals(deMatch.group(1), deMatch.group(2), deMatch.group(3))
+                x = extractFieldVals(*deMatch)
                 if x == "":
-                    print("Removed all fields in " + fname)
+                    print("Removed all fields in " + fname, file=messageFile)
                     anyFixes = True
                     removedLastLine = True
                     continue
                 if x:
-                    print("Removing fields in " + fname)
+                    print("Removing fields in " + fname, file=messageFile)
                     anyFixes = True
                     prevNotRemovedLineBlank = False
                     removedLastLine = False
-                    if args.fixFiles:
-                        newFile.write(x + ";\n")
+                    if editing:
+                        newLines.append(x + (";\r\n" if l.endswith("\r\n") else ";\n"))
                         continue
 
-        currLineBlank = bool(whiteSpacePatt.match(l))
+        # Blank lines only matter when fixing.
+        if not editing:
+            continue
+
+        currLineBlank = not l.strip()
         if removedLastLine and prevNotRemovedLineBlank and currLineBlank:
             continue
 
-        prevNotRemovedLineBlank = currLineBlank or blockStartPatt.match(l)
+        prevNotRemovedLineBlank = currLineBlank or l.startswith(blockStart) or l.endswith(blockEnds)
         removedLastLine = False
 
-        if args.fixFiles:
-            newFile.write(l)
+        newLines.append(l)
 
-    f.close()
+    if not editing or not anyFixes:
+        return
 
-    if args.fixFiles:
-        newFile.close()
-        if anyFixes:
-            os.rename(fname + ".intermediate", fname)
-        else:
-            os.remove(fname + ".intermediate")
+    if patchFile:
+        writePatch(patchFile, relativeName, lines, newLines)
+        return
 
+    with open(fname + ".intermediate", "w", newline="") as newFile:
+        newFile.writelines(newLines)
+    os.rename(fname + ".intermediate", fname)
 
-parser = argparse.ArgumentParser(description='Remove definitions of Cc, Ci, Cr, Cu')
-parser.add_argument('directory', metavar='D',
-                    help='Full path of directory to open files from')
 
-parser.add_argument('--fix', dest='fixFiles', action='store_true',
-                    help='Fix any errors that are found')
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Remove definitions of Cc, Ci, Cr, Cu')
+    parser.add_argument('directory', metavar='D',
+                        help='Full path of directory to open files from')
 
-args = parser.parse_args()
+    parser.add_argument('--fix', dest='fixFiles', action='store_true',
+                        help='Fix any errors that are found')
 
-# To save time, only look at file types that we think will contain JS.
-# XXX Don't include .sjs files for now, because on Android hostutils
-# they can run on an old version of XPCShell that does not contain bug
-# 767640.
-fileNamePatt = re.compile("^.+\.(?:js|jsm|html|py|xhtml|xul)$")
+    parser.add_argument('--emit-patch', dest='patchFile', metavar='FILE',
+                        help='Write a unified diff of the fixes to FILE, or to stdout if FILE is -, instead of changing any files')
 
-for (base, _, files) in os.walk(args.directory):
-    for fileName in files:
-        if not fileNamePatt.match(fileName):
-            continue
+    treewalk.addArguments(parser)
 
-        # XXX Hacky way to not process files in the objdir.
-        if "mc/obj-" in base:
-            continue
+    args = parser.parse_args()
+
+    if args.fixFiles and args.patchFile:
+        parser.error('--fix can not be used with --emit-patch')
 
-        if not base.endswith("/"):
-            base += "/"
+    patchFile = None
+    messageFile = sys.stdout
+    if args.patchFile == "-":
+        patchFile = sys.stdout
+        # Keep the patch on its own, so it can be piped into git apply.
+        messageFile = sys.stderr
+    elif args.patchFile:
+        patchFile = open(args.patchFile, "w", newline="")
+
+    # To save time, only look at file types that we think will contain JS.
+    # XXX Don't include .sjs files for now, because on Android hostutils
+    # they can run on an old version of XPCShell that does not contain bug
+    # 767640.
+    fileExtensions = [".js", ".jsm", ".html", ".py", ".xhtml", ".xul"]
+
+    for (base, fileName, _) in treewalk.files(args, args.directory, fileExtensions):
         fullFileName = base + fileName
 
         # test_bug790732.html creates Ci in content.
         # I'm not sure why dbg-actors fails to define Cu.
         if fileName == "test_bug790732.html" or fileName == "dbg-actors.js":
-            print("Skipping ignore listed file " + fullFileName)
+            print("Skipping ignore listed file " + fullFileName, file=messageFile)
             continue
 
         # XXX Skip httpd.js because this requires a version bump of
         # hostutils for Android.
         if fileName == "httpd.js":
-            print("Skipping ignore listed server file " + fullFileName)
+            print("Skipping ignore listed server file " + fullFileName, file=messageFile)
             continue
 
-        fileAnalyzer(args, fullFileName)
+        fileAnalyzer(args, fullFileName, os.path.relpath(fullFileName, args.directory), patchFile, messageFile)
+
+    if patchFile and patchFile is not sys.stdout:
+        patchFile.close()
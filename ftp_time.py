@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
 # FTP parser unit test date fixer.
 
@@ -6,50 +6,142 @@
 # the same time zone as Paris, but for testing purposes it is easier
 # to just use GMT. This script does the conversion.
 
+import re
+import os
 import argparse
-import datetime
 from datetime import datetime
-import os
 import pytz
 
 dateFormatString = "%m-%d-%Y  %H:%M:%S"
 
 sourceTimeZone = pytz.timezone('Europe/Paris')
 
-
-def fileAnalyzer(fname):
-    print "Analyzing", fname
-
-    f = open(fname, "r")
-    newFile = open(fname + ".intermediate", "w")
-
-    for l in f:
+# The expected output files of the tests, which are the ones with dates.
+testOutputExtension = ".out"
+
+datePatt = re.compile("(\\d\\d)-(\\d\\d)-(\\d\\d\\d\\d)  (\\d\\d):(\\d\\d):(\\d\\d)")
+
+
+# Convert the date at the start of a line from Paris time to UTC.
+def convertLine(l):
+    dateTimeString = l[:20]
+    dateTime = datetime.strptime(dateTimeString, dateFormatString)
+    dateTime = sourceTimeZone.localize(dateTime).astimezone(pytz.utc)
+    newString = datetime.strftime(dateTime, dateFormatString)
+    return newString + l[20:]
+
+
+# UTC offsets of Paris for each local date that has been seen, or None
+# for the days when the clocks change.
+dayOffsets = {}
+
+# UTC offsets of Paris for each local hour of the days when the clocks
+# change.
+hourOffsets = {}
+
+# Since 1912, the clocks in Paris have only ever changed on the hour, and
+# at most once a day. So an offset can be looked up once for each day,
+# and on the days when the clocks change, once for each hour, including
+# the hours that are skipped or repeated.
+firstHourlyYear = "1912"
+
+def utcOffset(year, month, day, hour):
+    dayKey = (year, month, day)
+    if dayKey not in dayOffsets:
+        first = sourceTimeZone.localize(datetime(year, month, day, 0)).utcoffset()
+        last = sourceTimeZone.localize(datetime(year, month, day, 23)).utcoffset()
+        dayOffsets[dayKey] = first if first == last else None
+    offset = dayOffsets[dayKey]
+    if offset is not None:
+        return offset
+
+    hourKey = (year, month, day, hour)
+    if hourKey not in hourOffsets:
+        hourOffsets[hourKey] = sourceTimeZone.localize(datetime(year, month, day, hour)).utcoffset()
+    return hourOffsets[hourKey]
+
+# Like convertLine, but the date is pulled apart and put back together
+# directly, and the UTC offsets come from utcOffset.
+def fastConvertLine(l):
+    dateMatch = datePatt.match(l)
+    if not dateMatch or dateMatch.group(3) < firstHourlyYear:
+        # Let strptime complain about anything odd.
+        return convertLine(l)
+
+    (month, day, year, hour, minute, second) = map(int, dateMatch.groups())
+    d = datetime(year, month, day, hour, minute, second) - utcOffset(year, month, day, hour)
+    return "%02d-%02d-%04d  %02d:%02d:%02d" % (d.month, d.day, d.year, d.hour, d.minute, d.second) + l[20:]
+
+
+# Convert every date in a file, writing it back all at once if anything
+# changed. With |verify|, check every date against convertLine instead,
+# without changing the file. Returns the number of dates that were
+# converted and how many of those didn't match convertLine.
+def fileAnalyzer(fname, verify):
+    print("Analyzing", fname)
+
+    # latin-1 and no newline translation, so the rest of each line is
+    # written back exactly as it was.
+    with open(fname, "r", encoding="latin-1", newline="") as f:
+        lines = f.readlines()
+
+    newLines = []
+    converted = 0
+    mismatches = 0
+    for l in lines:
         if not l[0].isdigit():
-            newFile.write(l)
+            newLines.append(l)
             continue
 
         # R-dls.out includes dates like this, which the date parsing
         # library does not like.
         if l.startswith("00-00-0000  00:00:00"):
-            newFile.write(l)
+            newLines.append(l)
             continue
 
-        dateTimeString = l[:20]
-        dateTime = datetime.strptime(dateTimeString, dateFormatString)
-        dateTime = sourceTimeZone.localize(dateTime).astimezone(pytz.utc)
-        newString = datetime.strftime(dateTime, dateFormatString)
+        newLine = fastConvertLine(l)
+        converted += 1
+        if verify:
+            expected = convertLine(l)
+            if newLine != expected:
+                print("Converted", repr(l), "to", repr(newLine), "instead of", repr(expected))
+                mismatches += 1
+        newLines.append(newLine)
 
-        newFile.write(newString + l[20:])
+    if verify or newLines == lines:
+        return (converted, mismatches)
 
-    f.close()
-    newFile.close()
+    with open(fname + ".intermediate", "w", encoding="latin-1", newline="") as newFile:
+        newFile.write("".join(newLines))
     os.rename(fname + ".intermediate", fname)
+    return (converted, mismatches)
 
 
 parser = argparse.ArgumentParser(description='Fix FTP unit test times.')
 parser.add_argument('fileName', metavar='F',
-                    help='Full path of directory to open files from')
+                    help='Full path of the file to fix, or of a directory to fix every ' +
+                    testOutputExtension + ' file in')
+
+parser.add_argument('--verify', dest='verify', action='store_true',
+                    help='Check that every date is converted the same way as with pytz for each line, '
+                    'without changing any files')
 
 args = parser.parse_args()
 
-fileAnalyzer(args.fileName)
+if os.path.isdir(args.fileName):
+    fileNames = [os.path.join(args.fileName, f) for f in sorted(os.listdir(args.fileName))
+                 if f.endswith(testOutputExtension)]
+else:
+    fileNames = [args.fileName]
+
+totalConverted = 0
+totalMismatches = 0
+for fname in fileNames:
+    (converted, mismatches) = fileAnalyzer(fname, args.verify)
+    totalConverted += converted
+    totalMismatches += mismatches
+
+if args.verify:
+    print("Checked", totalConverted, "dates in", len(fileNames), "files,", totalMismatches, "differences")
+    if totalMismatches:
+        exit(-1)
@@ -0,0 +1,330 @@
+#!/usr/bin/python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Generate a synthetic source tree that looks enough like mozilla-central
+# to exercise every script in this directory. The same arguments always
+# produce the same tree.
+
+import os
+import random
+import argparse
+
+
+firstModeLine = "/* -*- Mode: C++; tab-width: 8; indent-tabs-mode: nil; c-basic-offset: 2 -*- */\n"
+secondModeLine = "/* vim: set ts=8 sts=2 et sw=2 tw=80: */\n"
+mplLicense = ("/* This Source Code Form is subject to the terms of the Mozilla Public\n"
+              " * License, v. 2.0. If a copy of the MPL was not distributed with this\n"
+              " * file, You can obtain one at http://mozilla.org/MPL/2.0/. */\n")
+chromiumLicense = ("// Copyright (c) 2012 The Chromium Authors. All rights reserved.\n"
+                   "// Use of this source code is governed by a BSD-style license that can be\n"
+                   "// found in the LICENSE file.\n")
+
+# The headers C++ files start with, and how often they show up. Most
+# files are fine, and a few of them are broken in ways modeline.py
+# won't fix.
+cxxHeaders = [
+    (80, firstModeLine + secondModeLine + mplLicense),
+    (4, "/* -*- Mode: C++; tab-width: 2; indent-tabs-mode: nil; c-basic-offset: 2 -*- */\n" +
+        secondModeLine + mplLicense),
+    (3, "/* -*- Mode: c++; c-basic-offset: 2; indent-tabs-mode: nil; tab-width: 40 -*- */\n" +
+        "/* vim: set ts=2 et sw=2 tw=80: */\n" + mplLicense),
+    (4, mplLicense),
+    (2, "\n" + firstModeLine + secondModeLine + mplLicense),
+    (2, "/* vim: set ts=8 sts=2 et sw=2 tw=80: */\n" + mplLicense),
+    (2, chromiumLicense),
+    (2, firstModeLine + "\n" + mplLicense),
+    (1, "/* -*- Mode: C++; tab-width: 8; indent-tabs-mode: nil; c-basic-offset: 2 -*- foo\n" +
+        secondModeLine + mplLicense),
+]
+
+topDirs = ["accessible", "browser", "docshell", "dom", "gfx", "image", "ipc", "js",
+           "layout", "media", "netwerk", "parser", "security", "toolkit", "widget", "xpcom"]
+subDirNames = ["base", "src", "public", "ipc", "tests", "gtest", "components", "content",
+               "modules", "shared", "util", "html", "events", "style", "generic", "api"]
+wptDirNames = ["fetch", "html", "css", "dom", "websockets", "webauthn", "FileAPI",
+               "semantics", "forms", "api", "request", "basic", "workers", "streams"]
+
+tdAliasTypes = ["T_I8", "T_I16", "T_I32", "T_I64", "T_U8", "T_U16", "T_U32", "T_U64",
+                "T_FLOAT", "T_DOUBLE", "T_BOOL", "T_CHAR", "T_WCHAR", "T_VOID",
+                "T_CHAR_STR", "T_WCHAR_STR", "T_INTERFACE", "T_INTERFACE_IS",
+                "T_LEGACY_ARRAY", "T_UTF8STRING", "T_CSTRING", "T_ASTRING", "T_JSVAL",
+                "T_PROMISE", "T_ARRAY"]
+
+lsanAllowed = ["Alloc", "Create", "Malloc", "Realloc", "NS_NewURI", "js_pod_calloc",
+               "mozilla::dom::ChromeUtils::GenerateQI", "nsHostResolver::ResolveHost"]
+
+# File kinds, and how often they show up, not counting __dir__.ini files.
+fileKinds = [
+    (34, ".cpp"),
+    (24, ".h"),
+    (2, ".cc"),
+    (1, ".mm"),
+    (14, ".js"),
+    (5, ".jsm"),
+    (5, ".sys.mjs"),
+    (4, ".html"),
+    (2, ".xhtml"),
+    (1, ".sjs"),
+    (1, ".xul"),
+    (1, ".py"),
+    (4, ".idl"),
+]
+
+
+def weightedChoice(r, choices):
+    total = sum(w for (w, _) in choices)
+    x = r.uniform(0, total)
+    for (w, c) in choices:
+        x -= w
+        if x <= 0:
+            return c
+    return choices[-1][1]
+
+
+# Number of body lines for a file. Most files are short, and a few are
+# very long.
+def bodyLength(r):
+    return min(int(r.paretovariate(1.3) * 30), 8000)
+
+
+def randomDirectory(r, depth):
+    top = r.random()
+    if top < 0.02:
+        parts = ["obj-x86_64-pc-linux-gnu", "dist", "include"]
+    elif top < 0.05:
+        parts = [r.choice(topDirs), "third_party", r.choice(subDirNames)]
+    else:
+        parts = [r.choice(topDirs)]
+    for _ in range(r.randint(0, max(depth - 1, 0))):
+        parts.append(r.choice(subDirNames))
+    return "/".join(parts)
+
+
+def cxxBody(r, kind, lines):
+    indent = "    " if r.random() < 0.03 else "  "
+    out = []
+    if kind == ".h":
+        out.append("#ifndef mozilla_Generated_h\n#define mozilla_Generated_h\n\n")
+    includes = ["#include \"nsString.h\"\n"]
+    if r.random() < 0.3:
+        includes.append("#include \"nsCOMPtr.h\"\n")
+    if r.random() < 0.15:
+        includes.append("#include \"mozilla/nsRefPtr.h\"\n")
+    if r.random() < 0.1:
+        includes.append("#include \"nsAutoPtr.h\"\n")
+    out.extend(includes)
+    out.append("\nnamespace mozilla {\n\n")
+
+    n = 0
+    while n < lines:
+        k = r.random()
+        if k < 0.02:
+            out.append("NS_IMPL_CYCLE_COLLECTION_ROOT_NATIVE(Generated%d, AddRef)\n" % n)
+        elif k < 0.03:
+            out.append("NS_IMPL_CYCLE_COLLECTION_UNROOT_NATIVE(Generated%d,\n"
+                       "                                        Release)\n" % n)
+            n += 1
+        elif k < 0.05:
+            out.append(indent + "MOZ_DIAGNOSTIC_ASSERT(false, \"Unexpected state %d\");\n" % n)
+        elif k < 0.06:
+            out.append(indent + "MOZ_DIAGNOSTIC_ASSERT(false,\"Unexpected\");\n")
+        elif k < 0.09:
+            out.append(indent + "case nsXPTType::%s:\n" % r.choice(tdAliasTypes))
+        elif k < 0.11:
+            out.append(indent + "nsRefPtr<Generated> ref%d;\n" % n)
+        elif k < 0.14:
+            out.append(indent + "nsCOMPtr<nsISupports> supports%d;\n" % n)
+        elif k < 0.15:
+            out.append(indent + "nsAutoPtr<Generated> owned%d;\n" % n)
+        elif k < 0.2:
+            out.append("\n")
+        elif k < 0.25:
+            out.append(indent + "// Comment about line %d.\n" % n)
+        elif k < 0.26 and kind != ".h":
+            out.append("\tint tabbed%d = 0;\n" % n)
+        elif k < 0.45:
+            out.append(indent * 2 + "mValue%d = aValue + %d;\n" % (n, n))
+        elif k < 0.55:
+            out.append(indent + "if (aValue > %d) {\n" % n +
+                       indent * 2 + "return NS_ERROR_FAILURE;\n" +
+                       indent + "}\n")
+            n += 2
+        else:
+            out.append(indent + "uint32_t value%d = Compute(%d);\n" % (n, n))
+        n += 1
+
+    out.append("\n} // namespace mozilla\n")
+    if kind == ".h":
+        out.append("\n#endif // mozilla_Generated_h\n")
+    return "".join(out)
+
+
+def generateQICall(r, interfaces):
+    chosen = r.sample(interfaces, min(r.randint(1, 4), len(interfaces)))
+    if r.random() < 0.6:
+        items = ", ".join("Ci." + i if r.random() < 0.7 else '"' + i + '"' for i in chosen)
+        return "  QueryInterface: ChromeUtils.generateQI([%s]),\n" % items
+    return ("  QueryInterface: ChromeUtils.generateQI([\n" +
+            "".join("    Ci.%s,\n" % i for i in chosen) +
+            "  ]),\n")
+
+
+def jsBody(r, kind, lines, interfaces):
+    out = []
+    if kind in (".html", ".xhtml", ".xul"):
+        out.append("<!DOCTYPE HTML>\n<html>\n<head>\n<script type=\"application/javascript\">\n")
+    elif kind == ".py":
+        out.append("# Python file with embedded JS.\n\nSCRIPT = \"\"\"\n")
+    else:
+        out.append(mplLicense + "\n")
+
+    if r.random() < 0.08:
+        out.append("const { utils: Cu, interfaces: Ci, classes: Cc, results: Cr } = Components;\n\n")
+    elif r.random() < 0.04:
+        out.append("const { interfaces: Ci, manager: Cm } = Components;\n\n")
+    if r.random() < 0.05:
+        out.append("let Cu = Components.utils;\n\n")
+
+    n = 0
+    while n < lines:
+        k = r.random()
+        if k < 0.02 and interfaces:
+            out.append("const Generated%d = {\n" % n)
+            out.append(generateQICall(r, interfaces))
+            out.append("};\n")
+            n += 2
+        elif k < 0.025:
+            out.append("// ChromeUtils.generateQI([Ci.nsISupports]) in a comment.\n")
+        elif k < 0.03:
+            out.append("var Ci = Components.interfaces;\n")
+        elif k < 0.1:
+            out.append("\n")
+        elif k < 0.15:
+            out.append("  // Comment about line %d.\n" % n)
+        elif k < 0.3:
+            out.append("function generated%d(aValue) {\n  return aValue + %d;\n}\n" % (n, n))
+            n += 2
+        else:
+            out.append("  let value%d = compute(%d);\n" % (n, n))
+        n += 1
+
+    if kind in (".html", ".xhtml", ".xul"):
+        out.append("</script>\n</head>\n</html>\n")
+    elif kind == ".py":
+        out.append("\"\"\"\n")
+    return "".join(out)
+
+
+def idlBody(r, names, serial):
+    out = [mplLicense, "\n#include \"nsISupports.idl\"\n\ninterface nsIURI;\n"]
+    for name in names:
+        attributes = []
+        if r.random() < 0.9:
+            attributes.append("scriptable")
+            if r.random() < 0.3:
+                attributes.append("builtinclass")
+        if r.random() < 0.05:
+            attributes.append("function")
+        attributes.append("uuid(%08x-%04x-%04x-%04x-%012x)" % (serial, r.getrandbits(16), r.getrandbits(16),
+                                                               r.getrandbits(16), r.getrandbits(48)))
+        serial += 1
+        out.append("\n[%s]\ninterface %s : nsISupports\n{\n" % (", ".join(attributes), name))
+        for m in range(r.randint(1, 12)):
+            out.append("  readonly attribute ACString value%d;\n" % m)
+        out.append("  void doSomething(in nsIURI aURI);\n};\n")
+    return ("".join(out), serial)
+
+
+def dirIni(r):
+    out = []
+    if r.random() < 0.3:
+        out.append("prefs: [dom.generated.enabled:true]\n")
+    if r.random() < 0.7:
+        out.append("lsan-allowed: [%s]\n" % ", ".join(r.sample(lsanAllowed, r.randint(0, 4))))
+    if r.random() < 0.3:
+        out.append("leak-threshold: [default:51200]\n")
+    return "".join(out)
+
+
+def writeFile(path, contents):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="ascii", newline="\n") as f:
+        f.write(contents)
+
+
+# Generate a tree of about |fileCount| files in |directory|, which must
+# not exist or be empty, with directories up to |depth| levels deep
+# below the top level ones.
+def generate(directory, fileCount, depth, seed):
+    r = random.Random(seed)
+
+    if not directory.endswith("/"):
+        directory += "/"
+
+    # Pick interface names up front, so that JS can implement some of
+    # the interfaces that are declared in IDL files.
+    idlCount = max(fileCount * 4 // 100, 1)
+    interfaceNames = ["nsIGenerated%d" % i for i in range(idlCount * 2)]
+    implementedInterfaces = r.sample(interfaceNames, len(interfaceNames) // 3)
+    nextInterface = 0
+    serial = 0
+
+    iniCount = fileCount * 2 // 100
+    directories = [randomDirectory(r, depth) for _ in range(max(fileCount // 20, 1))]
+
+    for i in range(fileCount - iniCount):
+        kind = weightedChoice(r, fileKinds)
+        base = directory + r.choice(directories) + "/"
+        if kind == ".idl":
+            names = interfaceNames[nextInterface:nextInterface + 2]
+            nextInterface += 2
+            if not names:
+                kind = ".h"
+            else:
+                (contents, serial) = idlBody(r, names, serial)
+                writeFile(base + names[0] + ".idl", contents)
+                continue
+        if kind in (".cpp", ".h", ".cc", ".mm"):
+            contents = weightedChoice(r, cxxHeaders) + "\n" + cxxBody(r, kind, bodyLength(r))
+        else:
+            contents = jsBody(r, kind, bodyLength(r), implementedInterfaces)
+        writeFile(base + "Generated%d%s" % (i, kind), contents)
+
+    # Each WPT metadata directory has a single __dir__.ini file. There
+    # may be fewer possible paths than files, so a path that has already
+    # been used gets a number added to it.
+    wptDirectories = set()
+    for i in range(iniCount):
+        parts = [r.choice(wptDirNames) for _ in range(r.randint(1, max(depth, 1)))]
+        d = "/".join(parts)
+        if d in wptDirectories:
+            d += "-%d" % i
+        wptDirectories.add(d)
+    for d in sorted(wptDirectories):
+        writeFile(directory + "testing/web-platform/meta/" + d + "/__dir__.ini", dirIni(r))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate a synthetic mozilla-central-like source tree.')
+    parser.add_argument('directory', metavar='D',
+                        help='Directory to create the tree in. It must not exist or be empty.')
+
+    parser.add_argument('--files', dest='fileCount', type=int, default=10000,
+                        help='Approximate number of files to generate')
+
+    parser.add_argument('--depth', dest='depth', type=int, default=5,
+                        help='Maximum number of directory levels below the top level ones')
+
+    parser.add_argument('--seed', dest='seed', type=int, default=1,
+                        help='Random seed. The same seed always generates the same tree.')
+
+    args = parser.parse_args()
+
+    if os.path.exists(args.directory) and os.listdir(args.directory):
+        print('Directory', args.directory, 'is not empty.')
+        exit(-1)
+
+    generate(args.directory, args.fileCount, args.depth, args.seed)
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Benchmark modeline.py's indentation counters against each other.
+
+import time
+import argparse
+
+import modeline
+import treewalk
+
+
+def loadFiles(directory):
+    contents = []
+    for (base, fileName, _) in treewalk.walk(directory, ['.h', '.cpp', '.cc']):
+        with open(base + fileName, "rb") as f:
+            contents.append(f.read())
+    return contents
+
+
+def timeCounter(counter, contents, tabs, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [counter(data, tabs) for data in contents]
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return (best, results)
+
+
+parser = argparse.ArgumentParser(description='Benchmark the modeline.py indentation counters.')
+parser.add_argument('directory', metavar='D',
+                    help='Full path of directory to read files from')
+
+parser.add_argument('--tabs', dest='tabs', action='store_true',
+                    help='Also count lines with leading tabs')
+
+parser.add_argument('--repeat', dest='repeat', type=int, default=3,
+                    help='Number of times to run each counter, keeping the best time')
+
+args = parser.parse_args()
+
+if not modeline.numpy:
+    print('NumPy is not available, so there is nothing to compare against.')
+    exit(-1)
+
+contents = loadFiles(args.directory)
+totalBytes = sum(len(data) for data in contents)
+print('Loaded', len(contents), 'files,', totalBytes, 'bytes')
+
+(lineTime, lineResults) = timeCounter(modeline.lineIndentCounter, contents, args.tabs, args.repeat)
+(numpyTime, numpyResults) = timeCounter(modeline.numpyIndentCounter, contents, args.tabs, args.repeat)
+(autoTime, autoResults) = timeCounter(modeline.indentCounter, contents, args.tabs, args.repeat)
+
+if lineResults != numpyResults or lineResults != autoResults:
+    print('\n\nERROR!!!!')
+    print('Indentation counters disagree')
+    exit(-1)
+
+for (name, elapsed) in [('lines', lineTime), ('numpy', numpyTime), ('auto', autoTime)]:
+    print('%-6s %8.3fs %10.1f files/s %8.1f MB/s' % (name, elapsed, len(contents) / elapsed,
+                                                    totalBytes / elapsed / 1e6))
+print('speedup: %.2fx' % (lineTime / autoTime))
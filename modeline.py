@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
@@ -8,7 +8,23 @@
 
 import re
 import os
+import io
+import sys
+import json
+import hashlib
+import shutil
 import argparse
+import contextlib
+import functools
+import concurrent.futures
+
+import runstats
+import treewalk
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 commentyLinePatt = re.compile("^\s*\*")
@@ -274,25 +290,57 @@ def patternifyList(l):
     return re.compile("^.*(?:{core})$".format(core = "|".join([re.escape(s) for s in l])))
 
 
-wideDirIgnoreList = re.compile("^.*(?:{core}).*$".format(core = "|".join([re.escape(s) for s in wideDirIgnoreList])))
-
-dirIgnoreListPatt = patternifyList(dirIgnoreList)
-fileIgnoreListPatt = patternifyList(fileIgnoreList)
 indentAllowListPatt = patternifyList(indentAllowList)
 
 
-def fileInIgnoreList(base, fileName):
-    if wideDirIgnoreList.match(base):
-        return True
+def pathComponents(path):
+    return tuple(c for c in path.split("/") if c)
 
-    if dirIgnoreListPatt.match(base):
-        return True
-
-    if fileIgnoreListPatt.match(base + fileName):
-        return True
+# Index the entries of a path list by their number of components, so
+# checking whether a path ends with any of them takes one set lookup for
+# each distinct length, instead of a regex over the whole list.
+def suffixIndex(l):
+    index = {}
+    for s in l:
+        components = pathComponents(s)
+        index.setdefault(len(components), set()).add(components)
+    return index
 
+def hasSuffixIn(components, index):
+    for (n, entries) in index.items():
+        if components[-n:] in entries:
+            return True
     return False
 
+# The file ignore list is indexed by file name first, so most files only
+# need a single dictionary lookup.
+def fileSuffixIndex(l):
+    index = {}
+    for s in l:
+        components = pathComponents(s)
+        dirIndex = index.setdefault(components[-1], {})
+        dirIndex.setdefault(len(components) - 1, set()).add(components[:-1])
+    return index
+
+wideDirIgnoreIndex = suffixIndex(wideDirIgnoreList)
+dirIgnoreIndex = suffixIndex(dirIgnoreList)
+fileIgnoreIndex = fileSuffixIndex(fileIgnoreList)
+
+
+# Whole subtrees under directories in the wide ignore list are skipped,
+# so the walk doesn't need to descend into them.
+def dirInWideIgnoreList(dirComponents):
+    return hasSuffixIn(dirComponents, wideDirIgnoreIndex)
+
+def dirInIgnoreList(dirComponents):
+    return hasSuffixIn(dirComponents, dirIgnoreIndex)
+
+def fileInIgnoreList(dirComponents, fileName):
+    index = fileIgnoreIndex.get(fileName)
+    if index is None:
+        return False
+    return hasSuffixIn(dirComponents, index)
+
 def fileInIndentAllowList(fileName):
     if indentAllowListPatt.match(fileName):
         return True
@@ -302,130 +350,190 @@ def fileInIndentAllowList(fileName):
 def vimishLine(l):
     return l.startswith('/* vim:') or l.startswith('// vim:') or l.startswith(' * vim:')
 
-def fileAnalyzer(args, fname):
-    f = open(fname, "r")
-
-    if args.fixFiles:
-        newFile = open(fname + ".intermediate", "w")
-
-    count0 = 0
-    count2 = 0
-    count4 = 0
-    countOther = 0
-    tabCount = 0
+# The header a file should start with. Files that start with exactly
+# this don't need any further header analysis.
+canonicalHeader = (firstModeLine + secondModeLine + mplStart).encode("latin-1")
+
+
+# Source files are read as bytes, and header lines are decoded as
+# latin-1, so any byte sequence makes it through --fix unchanged.
+def sourceLines(readline):
+    while True:
+        l = readline()
+        if not l:
+            return
+        yield l.decode("latin-1")
+
+
+# Categories of findings that --fix can't do anything about.
+unfixableCategories = set([
+    'weird-modeline-ending',
+    'bad-first-line',
+    'bad-second-line',
+    'bad-third-line',
+    'tabs',
+    'odd-indentation',
+    'not-indented-by-2',
+])
+
+def addFinding(verdict, fname, line, category, counts=None):
+    verdict['findings'].append({'path': fname, 'line': line, 'category': category,
+                                'counts': counts,
+                                'fixable': category not in unfixableCategories})
+
+
+# Analyze the header of a file, reading lines from |lines| until the
+# header is done. Returns the lines the header should be replaced with,
+# the length of the existing header, the number of blank lines skipped
+# in it, and whether there were any errors.
+def headerAnalyzer(args, fname, lines, verdict):
+    newHeader = []
+    headerLength = 0
+    skippedBlankLines = 0
 
     whichLine = 0
+    lineNumber = 0
 
     anyErrors = False
 
-    for l in f:
+    for l in lines:
         whichLine += 1
-
-        if args.tabs:
-            fwp = fullWhitespacePatt.match(l)
-            if fwp and fwp.group(1).count("\t") != 0:
-                tabCount += 1
+        if whichLine > 3:
+            break
+        lineNumber += 1
+        headerLength += len(l)
 
         # If we're at the start of a file, see if it has the proper modeline.
         if whichLine == 1 and l != firstModeLine:
             if l == "\n":
                 # Skip leading blank lines.
+                addFinding(verdict, fname, lineNumber, 'leading-blank-line')
+                skippedBlankLines += 1
                 whichLine -= 1
                 continue
 
-            if args.fixFiles:
-                newFile.write(firstModeLine)
+            newHeader.append(firstModeLine)
 
             anyErrors = True
             fmlp = firstModeLinePatt.match(l)
             if fmlp:
-                print 'First line of', fname, 'had incorrect C++ mode line'
+                print('First line of', fname, 'had incorrect C++ mode line')
+                addFinding(verdict, fname, lineNumber, 'incorrect-cxx-modeline')
 
                 if fmlp.group(1) != "*/" and fmlp.group(1) != "":
-                    print '\n\nERROR!!!!'
-                    print 'Weird ending in', fname, 'for first mode line:', fmlp.group(1),
+                    addFinding(verdict, fname, lineNumber, 'weird-modeline-ending')
+                    print('\n\nERROR!!!!')
+                    print('Weird ending in', fname, 'for first mode line:', fmlp.group(1))
                     exit(-1)
             elif l == '/* -*- Mode: c++; c-basic-offset: 4; tab-width: 20; indent-tabs-mode: nil; -*-\n':
-                print 'First line of', fname, 'had dom/system/android/ style modeline'
+                print('First line of', fname, 'had dom/system/android/ style modeline')
+                addFinding(verdict, fname, lineNumber, 'android-modeline')
             elif l == mplStart:
-                print 'First line of', fname, 'is MPL instead of Emacs modeline'
-                if args.fixFiles:
-                    newFile.write(secondModeLine)
-                    newFile.write(mplStart)
+                print('First line of', fname, 'is MPL instead of Emacs modeline')
+                addFinding(verdict, fname, lineNumber, 'mpl-first-line')
+                newHeader.append(secondModeLine)
+                newHeader.append(mplStart)
                 whichLine += 2
             elif chromiumLicensePatt.match(l):
-                print 'First line of', fname, 'is Chromium license instead of Emacs modeline'
-                if args.fixFiles:
-                    newFile.write(secondModeLine)
-                    newFile.write(l)
+                print('First line of', fname, 'is Chromium license instead of Emacs modeline')
+                addFinding(verdict, fname, lineNumber, 'chromium-first-line')
+                newHeader.append(secondModeLine)
+                newHeader.append(l)
                 whichLine += 2
             elif vimishLine(l):
                 if l == secondModeLine:
-                    print 'First line of', fname, 'is vim modeline'
+                    print('First line of', fname, 'is vim modeline')
+                    addFinding(verdict, fname, lineNumber, 'vim-first-line')
                 else:
-                    print 'First line of', fname, 'is nonstandard vim modeline'
+                    print('First line of', fname, 'is nonstandard vim modeline')
+                    addFinding(verdict, fname, lineNumber, 'nonstandard-vim-first-line')
 
-                if args.fixFiles:
-                    newFile.write(secondModeLine)
+                newHeader.append(secondModeLine)
                 whichLine += 1
             else:
-                print '\n\nERROR!!!!'
-                print 'First line of', fname, 'does not match mode line:', l[:-1]
+                print('\n\nERROR!!!!')
+                print('First line of', fname, 'does not match mode line:', l[:-1])
+                addFinding(verdict, fname, lineNumber, 'bad-first-line')
                 exit(-1)
 
         elif whichLine == 2 and l != secondModeLine:
             if l == "\n":
                 # Skip blank lines after the Emacs mode line.
+                addFinding(verdict, fname, lineNumber, 'blank-second-line')
+                skippedBlankLines += 1
                 whichLine -= 1
                 continue
 
-            if args.fixFiles:
-                newFile.write(secondModeLine)
+            newHeader.append(secondModeLine)
 
             anyErrors = True
             if l == mplStart or l == mplOtherStart:
-                print 'Second line is MPL instead of VIM modeline'
-                if args.fixFiles:
-                    newFile.write(mplStart)
+                print('Second line is MPL instead of VIM modeline')
+                addFinding(verdict, fname, lineNumber, 'mpl-second-line')
+                newHeader.append(mplStart)
                 whichLine += 1
             elif chromiumLicensePatt.match(l):
-                print 'Second line is Chromium license instead of VIM modeline'
-                if args.fixFiles:
-                    newFile.write(l)
+                print('Second line is Chromium license instead of VIM modeline')
+                addFinding(verdict, fname, lineNumber, 'chromium-second-line')
+                newHeader.append(l)
                 whichLine += 1
             elif mplSpacerPatt.match(l):
-                print 'Replacing MPL spacer with vim mode line.'
+                print('Replacing MPL spacer with vim mode line.')
+                addFinding(verdict, fname, lineNumber, 'mpl-spacer-second-line')
             elif vimishLine(l):
-                print 'Second line of', fname, 'is weird vim mode line:', l[:-1]
+                print('Second line of', fname, 'is weird vim mode line:', l[:-1])
+                addFinding(verdict, fname, lineNumber, 'weird-vim-second-line')
             else:
-                print '\n\nERROR!!!!'
-                print 'Second line of', fname, 'does not match:', l[:-1]
+                print('\n\nERROR!!!!')
+                print('Second line of', fname, 'does not match:', l[:-1])
+                addFinding(verdict, fname, lineNumber, 'bad-second-line')
                 exit(-1)
 
         elif whichLine == 3 and l != mplStart and not chromiumLicensePatt.match(l):
             if l == '\n' or commentClosePatt.match(l) or mplSpacerPatt.match(l):
                 # Skip blank lines after the mode lines.
-                print 'Skipping a useless looking third line'
+                print('Skipping a useless looking third line')
+                addFinding(verdict, fname, lineNumber, 'useless-third-line')
+                if l == '\n':
+                    skippedBlankLines += 1
                 whichLine -= 1
                 continue
 
             if l == mplOtherStart:
-                if args.fixFiles:
-                    newFile.write(mplStart)
+                newHeader.append(mplStart)
                 anyErrors = True
-                print 'Third line is not MPL proper start'
+                print('Third line is not MPL proper start')
+                addFinding(verdict, fname, lineNumber, 'mpl-other-third-line')
             else:
-                print '\n\nERROR!!!!'
-                print 'Third line of', fname, 'is weird:', l[:-1]
+                print('\n\nERROR!!!!')
+                print('Third line of', fname, 'is weird:', l[:-1])
+                addFinding(verdict, fname, lineNumber, 'bad-third-line')
                 exit(-1)
 
-        elif args.fixFiles:
-            newFile.write(l)
+        else:
+            newHeader.append(l)
+
+    return (newHeader, headerLength, skippedBlankLines, anyErrors)
+
+
+# Count the lines of |data| that are indented by 0, a multiple of 2, a
+# multiple of 4, and an odd number of spaces. Lines that start with *
+# are probably comments, so they are ignored. If |tabs| is true, also
+# count the lines with tabs in their leading whitespace.
+def lineIndentCounter(data, tabs):
+    count0 = 0
+    count2 = 0
+    count4 = 0
+    countOther = 0
+    tabCount = 0
 
+    for l in io.StringIO(data.decode("latin-1")):
+        if tabs:
+            fwp = fullWhitespacePatt.match(l)
+            if fwp and fwp.group(1).count("\t") != 0:
+                tabCount += 1
 
-        # Analyze indentation.
         if commentyLinePatt.match(l):
-            # Lines that start with * are probably comments, so ignore them.
             continue
         indent = 0
         wsm = wsPatt.match(l)
@@ -441,18 +549,173 @@ def fileAnalyzer(args, fname):
         elif indent % 2 != 0:
             countOther += 1
 
+    return (count0, count2, count4, countOther, tabCount)
+
+
+# The bytes that \s matches in the patterns above, for numpyIndentCounter.
+if numpy:
+    whitespaceTable = numpy.array([bool(re.match(r"\s", chr(b))) for b in range(256)])
+
+# Same as lineIndentCounter, but it works on the whole buffer at once.
+def numpyIndentCounter(data, tabs):
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    end = len(buf)
+    if end == 0:
+        return (0, 0, 0, 0, 0)
+
+    lineStarts = numpy.flatnonzero(buf == ord("\n")) + 1
+    lineStarts = numpy.concatenate(([0], lineStarts[lineStarts < end]))
+    lineEnds = numpy.append(lineStarts[1:], end)
+
+    # Find the first byte at or after the start of each line that isn't
+    # in |mask|, or the end of the buffer if there isn't one.
+    def firstAfterStarts(mask):
+        positions = numpy.append(numpy.flatnonzero(mask), end)
+        return positions[numpy.searchsorted(positions, lineStarts)]
+
+    firstNonSpace = numpy.minimum(firstAfterStarts(buf != ord(" ")), lineEnds)
+    firstNonWhitespace = firstAfterStarts(~whitespaceTable[buf])
+    firstNonWhitespace = numpy.minimum(firstNonWhitespace, lineEnds)
 
+    commenty = buf[numpy.minimum(firstNonWhitespace, end - 1)] == ord("*")
+    commenty &= firstNonWhitespace < lineEnds
+
+    indent = (firstNonSpace - lineStarts)[~commenty]
+    count0 = numpy.count_nonzero(indent == 0)
+    count2 = numpy.count_nonzero((indent % 2 == 0) & (indent != 0))
+    count4 = numpy.count_nonzero((indent % 4 == 0) & (indent != 0))
+    countOther = numpy.count_nonzero(indent % 2 != 0)
+
+    tabCount = 0
+    if tabs:
+        firstTab = firstAfterStarts(buf == ord("\t"))
+        tabCount = numpy.count_nonzero(firstTab < firstNonWhitespace)
+
+    return (int(count0), int(count2), int(count4), int(countOther), int(tabCount))
+
+
+# NumPy has enough fixed overhead per call that the line by line counter
+# is faster for very small files.
+numpyMinimumSize = 512
+
+def indentCounter(data, tabs):
+    if numpy and len(data) >= numpyMinimumSize:
+        return numpyIndentCounter(data, tabs)
+    return lineIndentCounter(data, tabs)
+
+
+# Copy everything after the current position of file descriptor |src| to
+# the current position of |dst|. Where the OS supports it, the data is
+# copied in the kernel, without passing through Python.
+def copyFileTail(src, dst):
+    if hasattr(os, "copy_file_range"):
+        try:
+            while os.copy_file_range(src, dst, 1 << 30):
+                pass
+            return
+        except OSError:
+            # Not supported for this file system, or at all.
+            pass
+    if hasattr(os, "sendfile"):
+        try:
+            while os.sendfile(dst, src, None, 1 << 30):
+                pass
+            return
+        except OSError:
+            pass
+    while True:
+        buf = os.read(src, 1 << 20)
+        if not buf:
+            return
+        os.write(dst, buf)
+
+
+# Replace the first |headerLength| bytes of a file with |newHeader|. The
+# file isn't touched if that doesn't change anything, so its mtime is
+# left alone. Returns whether the file was changed.
+def fixHeader(fname, newHeader, headerLength):
+    newHeader = "".join(newHeader).encode("latin-1")
+    with open(fname, "rb") as f:
+        if f.read(headerLength) == newHeader:
+            return False
+        with open(fname + ".intermediate", "wb") as newFile:
+            newFile.write(newHeader)
+            newFile.flush()
+            os.lseek(f.fileno(), headerLength, os.SEEK_SET)
+            copyFileTail(f.fileno(), newFile.fileno())
+    shutil.copymode(fname, fname + ".intermediate")
+    os.rename(fname + ".intermediate", fname)
+    return True
+
+
+# Fix the header of a file, or with |deferFix|, record the fix in
+# |verdict| instead, so that the parent process can make it in walk
+# order, and only for files that a serial run would have got to.
+def applyHeaderFix(fname, newHeader, headerLength, verdict, stats, deferFix):
+    if deferFix:
+        verdict['fix'] = ["".join(newHeader), headerLength]
+        return
+    with stats.phase('write'):
+        if fixHeader(fname, newHeader, headerLength):
+            stats.count('fixed')
+
+
+# Analyze a single file. The header classification and indentation
+# counts are recorded in |verdict|, which is filled in as the analysis
+# goes, so it is still meaningful if we exit partway through. The time
+# spent in each phase is added to |stats|.
+def fileAnalyzer(args, fname, verdict, stats=runstats.disabled, deferFix=False):
+    verdict['findings'] = []
+    stats.count('analyzed')
+
+    f = open(fname, "rb")
+
+    if args.headerOnly:
+        # Most files have exactly the right header, so check for that
+        # before doing any line by line analysis.
+        with stats.phase('read'):
+            start = f.read(len(canonicalHeader))
+        stats.addBytes('read', len(start))
+        if start == canonicalHeader:
+            f.close()
+            return
+        f.seek(0)
+        with stats.phase('header'):
+            (newHeader, headerLength, _, anyErrors) = headerAnalyzer(args, fname, sourceLines(f.readline), verdict)
+        f.close()
+        if args.fixFiles:
+            applyHeaderFix(fname, newHeader, headerLength, verdict, stats, deferFix)
+        if anyErrors:
+            print()
+        return
+
+    with stats.phase('read'):
+        data = f.read()
+    stats.addBytes('read', len(data))
     f.close()
 
+    with stats.phase('header'):
+        (newHeader, headerLength, skippedBlankLines, anyErrors) = headerAnalyzer(args, fname, sourceLines(io.BytesIO(data).readline), verdict)
+
     if args.fixFiles:
-        newFile.close()
-        os.rename(fname + ".intermediate", fname)
+        applyHeaderFix(fname, newHeader, headerLength, verdict, stats, deferFix)
+
+    with stats.phase('indent', len(data)):
+        (count0, count2, count4, countOther, tabCount) = indentCounter(data, args.tabs)
+
+    # Blank lines that were skipped in the header don't count.
+    count0 -= skippedBlankLines
+
+    verdict['counts'] = [count0, count2, count4, countOther]
+    verdict['tabCount'] = tabCount
+    counts = {'count0': count0, 'count2': count2, 'count4': count4, 'countOther': countOther}
 
     if anyErrors:
-        print
+        print()
 
     if tabCount != 0:
-        print 'TABS in file', fname, 'on', tabCount, 'lines.'
+        print('TABS in file', fname, 'on', tabCount, 'lines.')
+        addFinding(verdict, fname, None, 'tabs', {'tabCount': tabCount})
 
     # Check that this file is probably indented by 2.
     probablyIndentedBy = -1
@@ -468,57 +731,268 @@ def fileAnalyzer(args, fname):
             if fileInIndentAllowList(fname):
                 probablyIndentedBy = 2
             else:
-                print '\n\nERROR!!!!'
-                print 'File with lots of oddly indented lines', fname
-                print '\tcount0: ', count0
-                print '\tcount2: ', count2
-                print '\tcount4: ', count4
-                print '\tcountOther: ', countOther
+                print('\n\nERROR!!!!')
+                print('File with lots of oddly indented lines', fname)
+                print('\tcount0: ', count0)
+                print('\tcount2: ', count2)
+                print('\tcount4: ', count4)
+                print('\tcountOther: ', countOther)
+                addFinding(verdict, fname, None, 'odd-indentation', counts)
                 exit(-1)
 
+    verdict['indentedBy'] = probablyIndentedBy
+
     if probablyIndentedBy != 2 and not fileInIndentAllowList(fname):
-        print 'Weird file', fname
-        print '\tcount0: ', count0
-        print '\tcount2: ', count2
-        print '\tcount4: ', count4
-        print '\tcountOther: ', countOther
-
-        print '\n\nERROR!!!!'
-        print 'File', fname, 'was probably indented by', probablyIndentedBy, 'instead of by 2'
+        print('Weird file', fname)
+        print('\tcount0: ', count0)
+        print('\tcount2: ', count2)
+        print('\tcount4: ', count4)
+        print('\tcountOther: ', countOther)
+
+        print('\n\nERROR!!!!')
+        print('File', fname, 'was probably indented by', probablyIndentedBy, 'instead of by 2')
+        addFinding(verdict, fname, None, 'not-indented-by-2', counts)
         exit(-1)
 
 
-parser = argparse.ArgumentParser(description='Analyze mode lines.')
-parser.add_argument('directory', metavar='D',
-                    help='Full path of directory to open files from')
+# Run fileAnalyzer with its output captured, so that results from worker
+# processes can be printed in the same order as a serial run, and so
+# they can be cached. Returns the output, the exit code if fileAnalyzer
+# tried to exit, the verdict, and the stats for the file if --stats was
+# given.
+def bufferedFileAnalyzer(args, fname):
+    out = io.StringIO()
+    exitCode = None
+    verdict = {}
+    stats = runstats.Stats(args.slowFileCount) if args.stats else runstats.disabled
+    with contextlib.redirect_stdout(out):
+        try:
+            with stats.file(fname):
+                fileAnalyzer(args, fname, verdict, stats, deferFix=True)
+        except SystemExit as e:
+            exitCode = e.code
+    return (out.getvalue(), exitCode, verdict, stats if args.stats else None)
+
+
+# Bump this when a change to fileAnalyzer makes old cache entries wrong.
+cacheVersion = 2
+
+# Cache entries are only valid for the ignore and allow lists and options
+# they were produced with.
+def cacheConfig(args):
+    h = hashlib.sha1()
+    for l in [wideDirIgnoreList, dirIgnoreList, fileIgnoreList, indentAllowList]:
+        h.update(repr(l).encode())
+    h.update(repr((cacheVersion, args.tabs, args.headerOnly)).encode())
+    return h.hexdigest()
+
+def loadCache(cacheFile, config):
+    try:
+        with open(cacheFile, "r") as f:
+            cache = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    if cache.get('config') != config:
+        return {}
+    return cache['files']
+
+def saveCache(cacheFile, config, files):
+    with open(cacheFile + ".intermediate", "w") as f:
+        json.dump({'config': config, 'files': files}, f)
+    os.replace(cacheFile + ".intermediate", cacheFile)
+
+def cachedResult(args, cache, fname, st):
+    entry = cache.get(fname)
+    if not entry or entry['mtime'] != st.st_mtime_ns or entry['size'] != st.st_size:
+        return None
+    # A file that needs fixing has to be analyzed again to fix it.
+    if args.fixFiles and any(f['fixable'] for f in entry['verdict']['findings']):
+        return None
+    return (entry['output'], entry['exit'], entry['verdict'])
+
+
+# Write the findings for a file to |findingsFile| as JSON lines.
+def writeFindings(findingsFile, verdict):
+    if not findingsFile:
+        return
+    for finding in verdict.get('findings', []):
+        findingsFile.write(json.dumps(finding) + "\n")
+
+
+# Analyze fileNames, printing the results in order. Files that are
+# unchanged since they were put in |cache| aren't opened. Returns the
+# exit code of the first file that wanted to exit, if any. Unless we're
+# keeping going, that is also the last file analyzed.
+def analyzeAll(args, fileNames, cache, findingsFile, stats):
+    entries = []
+    for fname in fileNames:
+        st = None
+        result = None
+        if cache is not None:
+            with stats.phase('cache'):
+                st = os.stat(fname)
+                result = cachedResult(args, cache, fname, st)
+            if result is not None:
+                stats.count('cached')
+        entries.append((fname, st, result))
+
+    analyzer = functools.partial(bufferedFileAnalyzer, args)
+    misses = [fname for (fname, _, result) in entries if result is None]
+    executor = None
+    if args.jobs > 1:
+        # Pool.terminate can deadlock if its task feeder thread is blocked
+        # when we stop early, so use an executor, which only feeds workers
+        # a few tasks at a time and can cancel the rest.
+        executor = concurrent.futures.ProcessPoolExecutor(args.jobs)
+        results = executor.map(analyzer, misses, chunksize=16)
+    else:
+        results = map(analyzer, misses)
+
+    firstExitCode = None
+    try:
+        for (fname, st, result) in entries:
+            if result is None:
+                (output, exitCode, verdict, fileStats) = next(results)
+                stats.merge(fileStats)
+                # Files after the one where we stop have been analyzed,
+                # but aren't fixed.
+                fix = verdict.pop('fix', None)
+                if fix:
+                    with stats.phase('write'):
+                        if fixHeader(fname, fix[0], fix[1]):
+                            stats.count('fixed')
+                result = (output, exitCode, verdict)
+                if cache is not None:
+                    cache[fname] = {'mtime': st.st_mtime_ns, 'size': st.st_size,
+                                    'output': result[0], 'exit': result[1],
+                                    'verdict': result[2]}
+            (output, exitCode, verdict) = result
+            sys.stdout.write(output)
+            writeFindings(findingsFile, verdict)
+            if exitCode is not None:
+                if not args.keepGoing:
+                    # Stop at the same file a serial run would have.
+                    return exitCode
+                if firstExitCode is None:
+                    firstExitCode = exitCode
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+    return firstExitCode
+
+
+sourceExtensions = ['.h', '.cpp', '.cc']
+
+# Find the files to analyze, adding any that are skipped due to the
+# ignore lists to |ignorelist|. Directories in the wide ignore list are
+# added instead of their files.
+def findFiles(args, ignorelist, stats=runstats.disabled):
+    directory = args.directory
+    rootComponents = pathComponents(directory)
+    for i in range(len(rootComponents)):
+        if dirInWideIgnoreList(rootComponents[:i + 1]):
+            ignorelist.append(directory)
+            return
+
+    def pruneDir(path):
+        if dirInWideIgnoreList(pathComponents(path)):
+            ignorelist.append(path)
+            return True
+        return False
+
+    lastBase = None
+    for (base, fileName, _) in treewalk.files(args, directory, sourceExtensions, pruneDir):
+        if base != lastBase:
+            lastBase = base
+            baseComponents = pathComponents(base)
+            ignoreAll = dirInIgnoreList(baseComponents)
 
-parser.add_argument('--fix', dest='fixFiles', action='store_true',
-                    help='Fix any errors that are found')
+        fullFileName = base + fileName
+        stats.count('seen')
 
-parser.add_argument('--tabs', dest='tabs', action='store_true',
-                    help='Analyze leading tabs')
+        if ignoreAll or fileInIgnoreList(baseComponents, fileName):
+            ignorelist.append(fullFileName)
+            stats.count('skipped')
+            continue
 
-args = parser.parse_args()
+        yield fullFileName
 
-ignorelist = []
 
-for (base, _, files) in os.walk(args.directory):
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Analyze mode lines.')
+    parser.add_argument('directory', metavar='D',
+                        help='Full path of directory to open files from')
 
-    for fileName in files:
-        if not (fileName.endswith('.h') or fileName.endswith('.cpp') or fileName.endswith('.cc')):
-            continue
+    parser.add_argument('--fix', dest='fixFiles', action='store_true',
+                        help='Fix any errors that are found')
 
-        if not base.endswith("/"):
-            base += "/"
-        fullFileName = base + fileName
+    parser.add_argument('--tabs', dest='tabs', action='store_true',
+                        help='Analyze leading tabs')
 
-        if fileInIgnoreList(base, fileName):
-            ignorelist.append(fullFileName)
-            continue
+    parser.add_argument('--header-only', dest='headerOnly', action='store_true',
+                        help='Only analyze the mode lines and license header, not indentation or tabs')
 
-        fileAnalyzer(args, fullFileName)
+    parser.add_argument('--jobs', '-j', dest='jobs', type=int, default=1,
+                        help='Number of processes to analyze files with')
 
-if ignorelist:
-    print 'Skipped files due to ignore list:'
-    for f in ignorelist:
-        print '   ', f
+    parser.add_argument('--cache', dest='cacheFile',
+                        help='Reuse results for files that have not changed since the last run with this cache file')
+
+    parser.add_argument('--keep-going', '-k', dest='keepGoing', action='store_true',
+                        help='Keep analyzing other files after an error, and exit with an error at the end')
+
+    parser.add_argument('--findings', dest='findingsFile',
+                        help='Write every finding to this file, as one JSON object per line')
+
+    treewalk.addArguments(parser)
+    runstats.addArguments(parser)
+
+    args = parser.parse_args()
+    stats = runstats.fromArgs(args)
+
+    findingsFile = None
+    if args.findingsFile:
+        # Line buffered, so findings can be read while the scan is running.
+        findingsFile = open(args.findingsFile, "w", buffering=1)
+
+    ignorelist = []
+    fileNames = stats.timedIterator('walk', findFiles(args, ignorelist, stats))
+    exitCode = None
+
+    if args.jobs > 1 or args.cacheFile:
+        cache = None
+        if args.cacheFile:
+            config = cacheConfig(args)
+            cache = loadCache(args.cacheFile, config)
+        try:
+            exitCode = analyzeAll(args, fileNames, cache, findingsFile, stats)
+        finally:
+            if args.cacheFile:
+                saveCache(args.cacheFile, config, cache)
+    else:
+        for fullFileName in fileNames:
+            verdict = {}
+            try:
+                with stats.file(fullFileName):
+                    fileAnalyzer(args, fullFileName, verdict, stats)
+            except SystemExit as e:
+                if not args.keepGoing:
+                    writeFindings(findingsFile, verdict)
+                    raise
+                if exitCode is None:
+                    exitCode = e.code
+            writeFindings(findingsFile, verdict)
+
+    if exitCode is not None and not args.keepGoing:
+        sys.stdout.flush()
+        exit(exitCode)
+
+    if ignorelist:
+        print('Skipped files due to ignore list:')
+        for f in ignorelist:
+            print('   ', f)
+
+    if exitCode is not None:
+        print('\n\nERROR!!!!')
+        print('There were errors in some files.')
+        exit(exitCode)
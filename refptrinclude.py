@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
@@ -6,22 +6,44 @@
 
 # Analyze the need for includes of nsRefPtr.h vs nsAutoPtr.h
 
-import re
 import os
+import re
+import json
 import argparse
+import collections
+
+import treewalk
 
 
 typeUsePatt = re.compile('(nsAutoPtr|nsRefPtr|nsCOMPtr|nsAutoArrayPtr)\<')
 arrayPatt = re.compile('Array')
 
+# The header that defines each type.
+typeHeaders = {
+    'nsRefPtr': 'nsRefPtr.h',
+    'nsAutoPtr': 'nsAutoPtr.h',
+    'nsCOMPtr': 'nsCOMPtr.h',
+}
 
-def fileAnalyzer(args, fname):
-    f = open(fname, "r")
+includePatt = re.compile(r'\s*#\s*include\s*([<"])([^>"]+)[>"]')
+
+
+# Returns which of the headers for the types |fname| includes, which of
+# the types it uses, and every include in it, as a list of the name and
+# whether it was a quoted include.
+def scanFile(fname):
+    f = open(fname, "r", encoding="latin-1")
 
     includes = set([])
     uses = set([])
+    allIncludes = []
 
     for l in f:
+        if '#' in l:
+            includeMatch = includePatt.match(l)
+            if includeMatch:
+                allIncludes.append([includeMatch.group(2), includeMatch.group(1) == '"'])
+
         if l.startswith('#include'):
             if 'mozilla/nsRefPtr.h' in l:
                 includes.add('nsRefPtr')
@@ -43,30 +65,260 @@ def fileAnalyzer(args, fname):
 
     f.close()
 
-    toRemove = includes - uses
-    toAdd = uses - includes
+    return (includes, uses, allIncludes)
+
+
+def printChanges(fname, toAdd, toRemove):
     if toRemove or toAdd:
-        print 'file:', fname,
+        print('file:', fname, end=' ')
         if toAdd:
-            print 'add:', ', '.join(toAdd), '\t',
+            print('add:', ', '.join(toAdd), '\t', end='')
         if toRemove:
-            print 'remove:', ', '.join(toRemove),
-        print
+            print('remove:', ', '.join(toRemove), end='')
+        print()
+
+
+def fileAnalyzer(args, fname):
+    (includes, uses, _) = scanFile(fname)
+    printChanges(fname, uses - includes, includes - uses)
+
+
+# Bump this when a change to scanFile makes old graph entries wrong.
+graphVersion = 1
+
+def loadGraph(graphFile):
+    try:
+        with open(graphFile, "r") as f:
+            graph = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    if graph.get('version') != graphVersion:
+        return {}
+    return graph['files']
+
+def saveGraph(graphFile, files):
+    # json.dump encodes in Python, which is much slower than dumps.
+    with open(graphFile + ".intermediate", "w") as f:
+        f.write(json.dumps({'version': graphVersion, 'files': files}))
+    os.replace(graphFile + ".intermediate", graphFile)
+
+
+# Bring |files|, which maps the path of each file relative to the
+# directory to what scanFile found in it, up to date with the tree. Only
+# files whose modification time or size has changed are read. Returns
+# the paths of the files that were found, in the order they were found,
+# and whether anything changed.
+def updateGraph(args, directory, files):
+    found = []
+    changed = False
+    for (base, fileName, _) in treewalk.files(args, directory, ['.h', '.cpp']):
+        fname = base + fileName
+        path = fname[len(directory):]
+        found.append(path)
+        st = os.stat(fname)
+        entry = files.get(path)
+        if entry and entry['mtime'] == st.st_mtime_ns and entry['size'] == st.st_size:
+            continue
+        changed = True
+        (includes, uses, allIncludes) = scanFile(fname)
+        files[path] = {'mtime': st.st_mtime_ns, 'size': st.st_size,
+                       'includes': sorted(includes), 'uses': sorted(uses),
+                       'allIncludes': allIncludes}
+
+    if args.changedSince:
+        # Only changed files were found, so only forget deleted files.
+        gone = [path for path in files if not os.path.exists(directory + path)]
+    else:
+        foundSet = set(found)
+        gone = [path for path in files if path not in foundSet]
+    for path in gone:
+        del files[path]
+        changed = True
+
+    return (found, changed)
+
+
+# The include graph of the tree. Includes of files that aren't in the
+# tree are included by their file name.
+class IncludeGraph:
+    def __init__(self, files):
+        self.files = files
+        self.byBaseName = {}
+        for path in files:
+            self.byBaseName.setdefault(os.path.basename(path), []).append(path)
+
+        self.edges = {}
+        self.reverseEdges = {}
+        for (path, entry) in files.items():
+            targets = [self.resolve(path, name, quoted) for (name, quoted) in entry['allIncludes']]
+            self.edges[path] = targets
+            for t in targets:
+                self.reverseEdges.setdefault(t, []).append(path)
+
+    # Returns the file that an include of |name| in |path| refers to. A
+    # quoted include can be relative to the including file. Otherwise, the
+    # file with that file name is used if there's only one, or the first one
+    # whose path ends with |name|.
+    def resolve(self, path, name, quoted):
+        baseName = os.path.basename(name)
+        candidates = self.byBaseName.get(baseName)
+        if not candidates:
+            return baseName
+        if quoted and path:
+            local = os.path.normpath(os.path.join(os.path.dirname(path), name))
+            if local in self.files:
+                return local
+        if len(candidates) == 1:
+            return candidates[0]
+        for c in candidates:
+            if c == name or c.endswith("/" + name):
+                return c
+        return baseName
+
+    # Returns a dictionary of everything reachable from |start| by following
+    # |edges|, mapping each one to the one it was reached from. If |stop|
+    # is reached, the search stops early. The edge |skipEdge| isn't followed.
+    def search(self, start, edges, stop=None, skipEdge=None):
+        parents = {start: None}
+        queue = collections.deque([start])
+        while queue:
+            node = queue.popleft()
+            for t in edges.get(node, ()):
+                if t in parents or (node, t) == skipEdge:
+                    continue
+                parents[t] = node
+                if t == stop:
+                    return parents
+                queue.append(t)
+        return parents
+
+    # Returns the chain of includes through which |path| gets |header|,
+    # or None if it doesn't.
+    def includePath(self, path, header):
+        parents = self.search(path, self.edges, stop=header)
+        if header not in parents or header == path:
+            return None
+        chain = [header]
+        while parents[chain[-1]] is not None:
+            chain.append(parents[chain[-1]])
+        return list(reversed(chain))
+
+    # Returns the files that would no longer get |header|, directly or
+    # indirectly, if |path| stopped including it directly. These are
+    # |path| and the files that include it, minus the files that still
+    # reach |header| some other way. Few files include any one file, and
+    # a common header can be included by most of the tree, so this
+    # searches forwards from each of them.
+    def wouldLose(self, path, header):
+        losers = []
+        for f in self.search(path, self.reverseEdges):
+            if header not in self.search(f, self.edges, stop=header, skipEdge=(path, header)):
+                losers.append(f)
+        return losers
+
+    def usesOf(self, path):
+        entry = self.files.get(path)
+        return set(entry['uses']) if entry else set()
+
+
+# Like fileAnalyzer, but headers that a file gets indirectly don't need
+# to be added, and headers aren't removed if a file that includes this
+# one, directly or indirectly, uses them and would no longer get them.
+def graphAnalyzer(graph, directory, path):
+    entry = graph.files[path]
+    includes = set(entry['includes'])
+    uses = set(entry['uses'])
+
+    toAdd = set([])
+    for t in uses - includes:
+        if not graph.includePath(path, graph.resolve(None, typeHeaders[t], False)):
+            toAdd.add(t)
+
+    toRemove = set([])
+    for t in includes - uses:
+        header = graph.resolve(None, typeHeaders[t], False)
+        if not any(t in graph.usesOf(f) for f in graph.wouldLose(path, header)):
+            toRemove.add(t)
+
+    printChanges(directory + path, toAdd, toRemove)
+
+
+def treePath(graph, directory, fname):
+    if os.path.isabs(fname):
+        fname = os.path.relpath(fname, directory)
+    if fname not in graph.files:
+        print('File', fname, 'is not in the include graph.')
+        exit(-1)
+    return fname
+
+
+def printIncludePath(graph, path, headerName):
+    header = graph.resolve(path, headerName, True)
+    chain = graph.includePath(path, header)
+    if chain:
+        print(headerName, 'is available in', path, 'through', ' -> '.join(chain))
+    else:
+        print(headerName, 'is not available in', path)
+
+
+def printRemovalEffects(graph, path, headerName):
+    header = graph.resolve(path, headerName, True)
+    if header not in graph.edges[path]:
+        print(path, 'does not include', headerName, 'directly')
+        return
+
+    types = set([t for (t, h) in typeHeaders.items() if h == os.path.basename(header)])
+    losers = graph.wouldLose(path, header)
+    if not losers:
+        print('Removing the include of', headerName, 'from', path, 'would not remove it from any files')
+        return
+    print('Removing the include of', headerName, 'from', path, 'would remove it from', len(losers), 'files:')
+    for f in losers:
+        used = sorted(types & graph.usesOf(f))
+        if used:
+            print('   ', f, '(uses ' + ', '.join(used) + ')')
+        else:
+            print('   ', f)
 
 
 parser = argparse.ArgumentParser(description='Analyze nsRefPtr includes.')
 parser.add_argument('directory', metavar='D',
                     help='Full path of directory to open files from')
 
+parser.add_argument('--graph', dest='graphFile', metavar='FILE',
+                    help='Keep the include graph of the tree in FILE, only rereading files that have changed, '
+                    'and take indirect includes into account')
+parser.add_argument('--is-available', dest='isAvailable', nargs=2, metavar=('FILE', 'HEADER'),
+                    help='Print whether FILE gets HEADER, directly or indirectly, and how, instead of analyzing files')
+parser.add_argument('--would-break', dest='wouldBreak', nargs=2, metavar=('FILE', 'HEADER'),
+                    help='Print the files that would no longer get HEADER if FILE stopped including it, '
+                    'instead of analyzing files')
+
+treewalk.addArguments(parser)
+
 args = parser.parse_args()
 
-for (base, _, files) in os.walk(args.directory):
-    for fileName in files:
-        if not (fileName.endswith('.h') or fileName.endswith('.cpp')):
-            continue
+if (args.isAvailable or args.wouldBreak) and not args.graphFile:
+    parser.error('--is-available and --would-break require --graph')
+
+if not args.graphFile:
+    for (base, fileName, _) in treewalk.files(args, args.directory, ['.h', '.cpp']):
+        fileAnalyzer(args, base + fileName)
+    exit(0)
 
-        if not base.endswith("/"):
-            base += "/"
-        fullFileName = base + fileName
+directory = os.path.abspath(args.directory) + "/"
+files = loadGraph(args.graphFile)
+(found, changed) = updateGraph(args, directory, files)
+if changed:
+    saveGraph(args.graphFile, files)
+graph = IncludeGraph(files)
 
-        fileAnalyzer(args, fullFileName)
+if args.isAvailable:
+    printIncludePath(graph, treePath(graph, directory, args.isAvailable[0]), args.isAvailable[1])
+elif args.wouldBreak:
+    printRemovalEffects(graph, treePath(graph, directory, args.wouldBreak[0]), args.wouldBreak[1])
+else:
+    # Print the file names the same way as without --graph.
+    printDirectory = os.path.join(args.directory, "")
+    for path in found:
+        graphAnalyzer(graph, printDirectory, path)
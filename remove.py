@@ -4,14 +4,20 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-# Modeline analyzer.
+# Macro invocation remover.
 
 import re
 import os
 import argparse
 
-# Skip lines that match this pattern.
-linePatt = re.compile("^NS_IMPL_CYCLE_COLLECTION_(?:UN)?ROOT_NATIVE")
+import treewalk
+
+# Remove invocations of macros that match these rules, when --rules and
+# --rule aren't given. A rule that is just an identifier is the name of a
+# macro. Anything else is a regexp that is matched at the start of a line.
+defaultRules = ["NS_IMPL_CYCLE_COLLECTION_(?:UN)?ROOT_NATIVE"]
+
+identifierPatt = re.compile(r"^\w+$")
 
 # Skip files that have these anywhere in their path.
 wideDirIgnoreList = []
@@ -45,67 +51,153 @@ def fileInIgnoreList(base, fileName):
     return False
 
 
-def fileAnalyzer(args, fname):
+# Read rules from a file, one per line. Blank lines and lines starting
+# with # are ignored.
+def loadRules(fname):
+    rules = []
+    with open(fname, "r") as f:
+        for l in f:
+            l = l.strip()
+            if l and not l.startswith("#"):
+                rules.append(l)
+    return rules
+
+
+# Combine all of the rules into a single regexp, so that each line is
+# only matched once no matter how many rules there are. Macro names can be
+# indented, and have to be followed by something that isn't part of an
+# identifier.
+def compileRules(rules):
+    alternatives = []
+    for r in rules:
+        if identifierPatt.match(r):
+            alternatives.append("\\s*" + re.escape(r) + "(?!\\w)")
+        else:
+            alternatives.append("(?:" + r + ")")
+    return re.compile("|".join(alternatives))
+
+
+# Parentheses in string and character literals and comments don't count.
+tokenPatt = re.compile(r"""\"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|//.*|/\*.*?\*/|[()]""")
+
+# Returns how much deeper in parentheses the end of |l| is than the
+# start, and whether there were any parentheses.
+def parenDepthChange(l):
+    change = 0
+    anyParens = False
+    for t in tokenPatt.findall(l):
+        if t == "(":
+            change += 1
+            anyParens = True
+        elif t == ")":
+            change -= 1
+            anyParens = True
+    return (change, anyParens)
+
+
+# Remove every macro invocation matched by |rulesPatt|, including all of
+# the lines up to the parenthesis that closes it. If a matched line has
+# no parentheses, the arguments can start on a later line. Otherwise,
+# the line is removed on its own.
+def fileAnalyzer(args, fname, rulesPatt):
     f = open(fname, "r")
-    skipNext = False
+    anyFixed = False
+    newLines = []
 
-    if args.fixFiles:
-        tempFileName = fname + ".intermediate"
-        anyFixed = False
-        newFile = open(tempFileName, "w")
+    # The lines of the invocation being removed, whether its first
+    # parenthesis has been seen, and how deep in parentheses the end of
+    # the last line is.
+    invocation = []
+    opened = False
+    depth = 0
+
+    # Blank lines after a matched line without parentheses. They are only
+    # removed if the arguments come after them.
+    blankLines = []
 
     for l in f:
-        if skipNext:
+        if invocation and not opened:
+            if not l.strip():
+                blankLines.append(l)
+                continue
+            if l.lstrip().startswith("("):
+                for b in blankLines:
+                    print("\tSkipped line " + b[:-1])
+                invocation.extend(blankLines)
+                opened = True
+                depth = 0
+            else:
+                # The macro doesn't have any arguments.
+                newLines.extend(blankLines)
+                invocation = []
+            blankLines = []
+
+        if invocation:
             print("\tSkipped line " + l[:-1])
-            skipNext = False
+            invocation.append(l)
+            depth += parenDepthChange(l)[0]
+            if depth <= 0:
+                invocation = []
             continue
 
-        lp = linePatt.match(l)
-        if lp:
+        if rulesPatt.match(l):
             print("Matched line " + l[:-1])
             anyFixed = True
-            if l[-2] != ")":
-                skipNext = True
+            (depth, anyParens) = parenDepthChange(l)
+            if not anyParens or depth > 0:
+                invocation = [l]
+                opened = anyParens
             continue
-        if args.fixFiles:
-            newFile.write(l)
+
+        newLines.append(l)
 
     f.close()
 
-    if args.fixFiles:
-        newFile.close()
-        if anyFixed:
-            os.rename(tempFileName, fname)
-        else:
-            os.remove(tempFileName)
+    if invocation and not opened:
+        newLines.extend(blankLines)
+    elif invocation:
+        # Don't remove the rest of the file if a parenthesis is missing.
+        print("Unbalanced parentheses, not removing lines starting with " + invocation[0][:-1])
+        newLines.extend(invocation)
 
+    if args.fixFiles and anyFixed:
+        tempFileName = fname + ".intermediate"
+        with open(tempFileName, "w") as newFile:
+            newFile.writelines(newLines)
+        os.rename(tempFileName, fname)
 
-parser = argparse.ArgumentParser(description='Analyze mode lines.')
+
+parser = argparse.ArgumentParser(description='Remove macro invocations.')
 parser.add_argument('directory', metavar='D',
                     help='Full path of directory to open files from')
 
 parser.add_argument('--fix', dest='fixFiles', action='store_true',
                     help='Fix any errors that are found')
 
-args = parser.parse_args()
+parser.add_argument('--rules', dest='rulesFiles', action='append', default=[], metavar='FILE',
+                    help='Read rules from FILE, one macro name or regexp per line. Can be given more than once.')
+parser.add_argument('--rule', dest='rules', action='append', default=[], metavar='RULE',
+                    help='Remove invocations of this macro name, or lines starting with this regexp. Can be given more than once.')
 
-ignorelist = []
+treewalk.addArguments(parser)
 
-for (base, _, files) in os.walk(args.directory):
+args = parser.parse_args()
 
-    for fileName in files:
-        if not fileName.endswith('.cpp'):
-            continue
+rules = list(args.rules)
+for rulesFile in args.rulesFiles:
+    rules += loadRules(rulesFile)
+rulesPatt = compileRules(rules or defaultRules)
+
+ignorelist = []
 
-        if not base.endswith("/"):
-            base += "/"
-        fullFileName = base + fileName
+for (base, fileName, _) in treewalk.files(args, args.directory, ['.cpp']):
+    fullFileName = base + fileName
 
-#        if fileInIgnoreList(base, fileName):
-#            ignorelist.append(fullFileName)
-#            continue
+#    if fileInIgnoreList(base, fileName):
+#        ignorelist.append(fullFileName)
+#        continue
 
-        fileAnalyzer(args, fullFileName)
+    fileAnalyzer(args, fullFileName, rulesPatt)
 
 if ignorelist:
     print('Skipped files due to ignore list:')
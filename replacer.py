@@ -6,44 +6,123 @@
 
 # Replace text in files matching a pattern.
 
-import re
 import os
+import re
 import argparse
 
-# To save time, only look at file types that we think will contain C++.
-fileNamePatt = re.compile("^.+\\.(?:cpp|h|cc|mm)$")
-
-def fileAnalyzer(args, fname, encoding):
-    f = open(fname, "r", encoding=encoding)
-    anyFixes = False
+import treewalk
 
-    if args.fixFiles:
-        newFile = open(fname + ".intermediate", "w")
-
-    for l in f:
-        l2 = l.replace("MOZ_DIAGNOSTIC_ASSERT(false, ", "MOZ_DIAGNOSTIC_CRASH(")
-        if l2 == l:
-            l2 = l.replace("MOZ_DIAGNOSTIC_ASSERT(false,", "MOZ_DIAGNOSTIC_CRASH(")
-        if l2 != l:
-            print("found something in file %s" % fname)
-            anyFixes = True
-            if args.fixFiles:
-                newFile.write(l2)
-                continue
-            print(l[:-1])
-            print(l2[:-1])
+# To save time, only look at file types that we think will contain C++.
+fileExtensions = [".cpp", ".h", ".cc", ".mm"]
+
+# Text to replace, and what to replace it with, when --table and
+# --replace aren't given.
+defaultReplacements = {
+    "MOZ_DIAGNOSTIC_ASSERT(false, ": "MOZ_DIAGNOSTIC_CRASH(",
+    "MOZ_DIAGNOSTIC_ASSERT(false,": "MOZ_DIAGNOSTIC_CRASH(",
+}
+
+# Read a replacement table from a file. Each line has the text to
+# replace and what to replace it with, separated by a tab. Everything
+# else on the line is significant, including spaces. Lines without a tab
+# that are blank or start with # are ignored.
+def loadReplacements(fname, replacements):
+    with open(fname, "r", encoding="utf8") as f:
+        for (lineNumber, l) in enumerate(f, 1):
+            l = l.rstrip("\n")
+            if "\t" not in l:
+                if l.strip() == "" or l.startswith("#"):
+                    continue
+                print("%s:%d: Expected a tab between the text to replace and the replacement" % (fname, lineNumber))
+                exit(-1)
+            (before, after) = l.split("\t", 1)
+            addReplacement(replacements, before, after)
+
+def addReplacement(replacements, before, after):
+    if before == "" or "\n" in before:
+        print("Can not replace empty text or text containing a newline")
+        exit(-1)
+    if replacements.get(before, after) != after:
+        print("Conflicting replacements for " + repr(before))
+        exit(-1)
+    replacements[before] = after
+
+
+# Build a single bytes regexp that matches any of |words|, preferring the
+# longest one at the leftmost position. The words are put into a trie,
+# which is turned into nested groups, so at each position in the text the
+# regexp only follows the one branch that matches the next character,
+# instead of trying every word. This gets most of the benefit of an
+# Aho-Corasick automaton while doing the matching in the regexp engine.
+def trieRegexp(words):
+    trie = {}
+    for w in words:
+        node = trie
+        for i in range(len(w)):
+            node = node.setdefault(w[i:i + 1], {})
+        # The end of a word. No byte is the empty string.
+        node[b""] = {}
+
+    def nodeRegexp(node):
+        alternatives = [re.escape(c) + nodeRegexp(child) for (c, child) in sorted(node.items()) if c]
+        if not alternatives:
+            return b""
+        isEnd = b"" in node
+        if len(alternatives) == 1 and not isEnd:
+            return alternatives[0]
+        # Trying the longer words first, and making the group optional
+        # if a word ends here, gives the longest match.
+        return b"(?:" + b"|".join(alternatives) + b")" + (b"?" if isEnd else b"")
+
+    return re.compile(nodeRegexp(trie))
+
+
+# Lines are only decoded to print them.
+def displayLine(l):
+    l = l.rstrip(b"\r\n")
+    try:
+        return l.decode("utf8")
+    except UnicodeDecodeError:
+        return l.decode("latin-1")
+
+# Files are never decoded, so files in any encoding, and their line
+# endings, are kept exactly as they are apart from the replacements.
+def fileAnalyzer(args, fname, replacePatt, replacements):
+    with open(fname, "rb") as f:
+        text = f.read()
+
+    # Most files don't contain anything to replace.
+    if not replacePatt.search(text):
+        return
+
+    def replaceMatch(m):
+        return replacements[m.group(0)]
+
+    # Only the lines with a match are looked at. The text to replace
+    # never contains a newline, so each match is within one line.
+    newText = []
+    end = 0
+    for m in replacePatt.finditer(text):
+        if m.start() < end:
+            # This line has already been replaced.
             continue
-        if args.fixFiles:
-            newFile.write(l)
-
-    f.close()
+        start = text.rfind(b"\n", 0, m.start()) + 1
+        newText.append(text[end:start])
+        end = text.find(b"\n", m.end()) + 1 or len(text)
+
+        l = text[start:end]
+        l2 = replacePatt.sub(replaceMatch, l)
+        print("found something in file %s" % fname)
+        if not args.fixFiles:
+            print(displayLine(l))
+            print(displayLine(l2))
+        newText.append(l2)
+    newText.append(text[end:])
 
     if args.fixFiles:
-        newFile.close()
-        if anyFixes:
-            os.rename(fname + ".intermediate", fname)
-        else:
-            os.remove(fname + ".intermediate")
+        with open(fname + ".intermediate", "wb") as newFile:
+            newFile.writelines(newText)
+        os.rename(fname + ".intermediate", fname)
 
 
 parser = argparse.ArgumentParser(description='Replace text in C++ files')
@@ -53,24 +132,27 @@ parser.add_argument('directory', metavar='D',
 parser.add_argument('--fix', dest='fixFiles', action='store_true',
                     help='Fix any errors that are found')
 
-args = parser.parse_args()
+parser.add_argument('--table', dest='tableFiles', action='append', default=[], metavar='FILE',
+                    help='Read replacements from FILE, one per line, with a tab between the text and its replacement. Can be given more than once.')
+parser.add_argument('--replace', dest='replacements', action='append', default=[], nargs=2,
+                    metavar=('TEXT', 'REPLACEMENT'),
+                    help='Replace TEXT with REPLACEMENT. Can be given more than once.')
 
+treewalk.addArguments(parser)
 
-for (base, _, files) in os.walk(args.directory):
-    for fileName in files:
-        if not fileNamePatt.match(fileName):
-            continue
+args = parser.parse_args()
 
-        # XXX Hacky way to not process files in the objdir.
-        if "mc/obj-" in base:
-            continue
+replacements = {}
+for tableFile in args.tableFiles:
+    loadReplacements(tableFile, replacements)
+for (before, after) in args.replacements:
+    addReplacement(replacements, before, after)
+if not replacements:
+    replacements = defaultReplacements
+replacements = {before.encode("utf8"): after.encode("utf8") for (before, after) in replacements.items()}
+replacePatt = trieRegexp(replacements)
 
-        if not base.endswith("/"):
-            base += "/"
-        fullFileName = base + fileName
+for (base, fileName, _) in treewalk.files(args, args.directory, fileExtensions):
+    fullFileName = base + fileName
 
-        try:
-            fileAnalyzer(args, fullFileName, "utf8")
-        except UnicodeDecodeError:
-            print("utf8 encoding failed for " + fullFileName)
-            fileAnalyzer(args, fullFileName, "latin-1")
+    fileAnalyzer(args, fullFileName, replacePatt, replacements)
@@ -0,0 +1,162 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Per-phase timing and file counters for the --stats option of the
+# scripts in this directory.
+
+import os
+import sys
+import time
+import heapq
+import atexit
+import contextlib
+
+
+# Accumulates the wall clock time, CPU time and bytes for each phase of a
+# run, counters like the number of files analyzed, and the slowest files.
+# Everything in here can be pickled, so that worker processes can send
+# back their stats to be merged.
+class Stats:
+    def __init__(self, slowFileCount=10):
+        self.start = time.perf_counter()
+        # Phase name -> [wall seconds, CPU seconds, bytes]
+        self.phases = {}
+        self.counters = {}
+        self.slowFileCount = slowFileCount
+        # Heap of (seconds, file name, size), with the fastest first.
+        self.slowFiles = []
+
+    def addPhase(self, name, wall, cpu, byteCount=0):
+        p = self.phases.setdefault(name, [0.0, 0.0, 0])
+        p[0] += wall
+        p[1] += cpu
+        p[2] += byteCount
+
+    def addBytes(self, name, byteCount):
+        self.addPhase(name, 0.0, 0.0, byteCount)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextlib.contextmanager
+    def phase(self, name, byteCount=0):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.addPhase(name, time.perf_counter() - wall, time.process_time() - cpu, byteCount)
+
+    def addFile(self, fname, seconds, size):
+        if len(self.slowFiles) < self.slowFileCount:
+            heapq.heappush(self.slowFiles, (seconds, fname, size))
+        elif self.slowFileCount and seconds > self.slowFiles[0][0]:
+            heapq.heapreplace(self.slowFiles, (seconds, fname, size))
+
+    # Time everything that is done with a file, for the slow file log.
+    @contextlib.contextmanager
+    def file(self, fname, size=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if size is None:
+                try:
+                    size = os.stat(fname).st_size
+                except OSError:
+                    size = 0
+            self.addFile(fname, elapsed, size)
+
+    # Yield the items of |iterable|, counting the time spent getting each
+    # one as part of phase |name|. This is for timing generators, like
+    # the tree walkers, that are interleaved with everything else.
+    def timedIterator(self, name, iterable):
+        it = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            yield item
+
+    def merge(self, other):
+        if not isinstance(other, Stats):
+            return
+        for (name, (wall, cpu, byteCount)) in other.phases.items():
+            self.addPhase(name, wall, cpu, byteCount)
+        for (name, n) in other.counters.items():
+            self.count(name, n)
+        for (seconds, fname, size) in other.slowFiles:
+            self.addFile(fname, seconds, size)
+
+    # Print everything. Phase times from worker processes are summed, so
+    # they can add up to more than the total.
+    def report(self, out=None):
+        out = out or sys.stderr
+        elapsed = time.perf_counter() - self.start
+
+        print(file=out)
+        print('%-12s %10s %10s %10s %10s' % ('phase', 'wall s', 'CPU s', 'MB', 'MB/s'), file=out)
+        for (name, (wall, cpu, byteCount)) in self.phases.items():
+            rate = ''
+            if byteCount and wall:
+                rate = '%.1f' % (byteCount / wall / 1e6)
+            print('%-12s %10.3f %10.3f %10.1f %10s' % (name, wall, cpu, byteCount / 1e6, rate), file=out)
+        print('%-12s %10.3f %10.3f' % ('total', elapsed, time.process_time()), file=out)
+
+        if self.counters:
+            print(file=out)
+            print('files:', ', '.join('%s %d' % (name, n) for (name, n) in self.counters.items()), file=out)
+
+        if self.slowFiles:
+            print(file=out)
+            print('Slowest files:', file=out)
+            for (seconds, fname, size) in sorted(self.slowFiles, reverse=True):
+                print('   %8.3fs %10d bytes  %s' % (seconds, size, fname), file=out)
+
+
+# Stand-in for Stats when --stats isn't given, so that the scripts don't
+# need to check whether stats are enabled everywhere.
+class NullStats:
+    def addPhase(self, name, wall, cpu, byteCount=0):
+        pass
+
+    def addBytes(self, name, byteCount):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def phase(self, name, byteCount=0):
+        return contextlib.nullcontext()
+
+    def file(self, fname, size=None):
+        return contextlib.nullcontext()
+
+    def timedIterator(self, name, iterable):
+        return iterable
+
+    def merge(self, other):
+        pass
+
+disabled = NullStats()
+
+
+def addArguments(parser):
+    parser.add_argument('--stats', dest='stats', action='store_true',
+                        help='Print how long each phase of the run took, and the slowest files, at exit')
+    parser.add_argument('--slow-files', dest='slowFileCount', type=int, default=10, metavar='N',
+                        help='Number of slowest files to print with --stats')
+
+
+# Returns a Stats that is reported at exit if --stats was given, or a
+# NullStats otherwise.
+def fromArgs(args):
+    if not args.stats:
+        return disabled
+    stats = Stats(args.slowFileCount)
+    atexit.register(stats.report)
+    return stats
@@ -4,12 +4,15 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-# Analyze the need for includes of nsRefPtr.h vs nsAutoPtr.h
+# Replace uses of the nsXPTType::T_* aliases with the TD_* values they
+# are aliases for, or do any other renaming of identifiers.
 
 import re
 import os
 import argparse
 
+import treewalk
+
 
 tdAliases = """
   TD_ALIAS_(T_I8, TD_INT8);
@@ -46,84 +49,119 @@ tdAliases = """
 
 
 
-def getAliases():
+# Returns a table of renames from the TD_ALIAS_ lines in |text|.
+def getAliases(text):
     aliasPatt = re.compile('TD_ALIAS_\(([^,]+), ([^)]+)\)')
-    replacements = []
-    befores = []
-    for l in tdAliases.splitlines():
+    renames = {}
+    for l in text.splitlines():
+        # Skip the definition of the macro.
+        if l.lstrip().startswith("#"):
+            continue
         aliasMatch = aliasPatt.search(l)
         if not aliasMatch:
             continue
         before = "nsXPTType::" + aliasMatch.group(1)
         after = aliasMatch.group(2)
-        replacements.append([before, after])
-        befores.append(before)
-    beforeRe = re.compile('|'.join(befores))
-
-    # T_INTERFACE is a prefix of T_INTERFACE_IS, but TD_INTERFACE_TYPE
-    # is not a prefix of TD_INTERFACE_IS_TYPE. This means we have to
-    # substitute T_INTERFACE_IS first. To work around this general problem,
-    # we sort the replacements from longest to shortest.
-    replacements = sorted(replacements, reverse=True, key=lambda x: len(x[0]))
-    for x in replacements:
-        print(f'{x[0]} --> {x[1]}')
+        renames[before] = after
+    return renames
+
+
+identifierPatt = re.compile("^(?:::)?\\w+(?:::\\w+)*$")
+
+# Read a table of renames from a file, with the old and new name on each
+# line, separated by whitespace. Names can be qualified. Blank lines and
+# lines starting with # are ignored.
+def loadRenames(fname):
+    renames = {}
+    with open(fname, "r") as f:
+        for (lineNumber, l) in enumerate(f, 1):
+            fields = l.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            if len(fields) != 2 or not all(identifierPatt.match(x) for x in fields):
+                print("%s:%d: Expected an old and a new identifier" % (fname, lineNumber))
+                exit(-1)
+            renames[fields[0]] = fields[1]
+    return renames
+
+
+# A single regexp that matches any of the old names, but not as part of
+# a longer identifier. The check for an identifier character before the
+# name comes after each name, so that the regexp engine can still search
+# for the start of the names directly, which is much faster.
+def renamesRegexp(renames):
+    names = sorted(renames, key=len, reverse=True)
+    alternatives = [re.escape(n) + "(?<!\\w.{%d})" % len(n) for n in names]
+    return re.compile("(?:" + "|".join(alternatives) + ")(?!\\w)")
+
+
+# Comments and string and character literals, which are left alone. A
+# block comment that isn't closed runs to the end of the file, and a
+# literal that isn't closed runs to the end of the line. A ' after a
+# letter, digit or underscore is a digit separator, as in 1'000, unless
+# it comes after an encoding prefix like L or u8.
+lexPatt = re.compile(r"""//[^\n]*|/\*[\s\S]*?(?:\*/|\Z)|"(?:\\[\s\S]|[^"\\\n])*"?|"""
+                     r"""'(?:(?<!\w')|(?<=(?<!\w)[uUL]')|(?<=(?<!\w)u8'))(?:\\[\s\S]|[^'\\\n])*'?""")
+
+# Rename everything in |text| that isn't in a comment or a literal. The
+# names are found first, and the file is only lexed as far as the last
+# one, one comment or literal at a time.
+def renameText(text, renamePatt, renames):
+    pieces = []
+    copied = 0
+    token = lexPatt.search(text)
+    for m in renamePatt.finditer(text):
+        while token and token.end() <= m.start():
+            token = lexPatt.search(text, token.end())
+        if token and token.start() <= m.start():
+            continue
+        pieces.append(text[copied:m.start()])
+        pieces.append(renames[m.group(0)])
+        copied = m.end()
+    pieces.append(text[copied:])
+    return "".join(pieces)
 
-    return [beforeRe, replacements]
 
+def fileAnalyzer(args, fname, renamePatt, renames):
+    with open(fname, "r") as f:
+        text = f.read()
 
-def fileAnalyzer(args, fname, beforeRe, replacements):
-    f = open(fname, "r")
+    # Most files have nothing to rename.
+    if not renamePatt.search(text):
+        return
 
-    if args.fixFiles:
-        tempFileName = fname + ".intermediate"
-        anyFixed = False
-        newFile = open(tempFileName, "w")
-
-    for l in f:
-        m = beforeRe.search(l)
-        if m:
-            foundReplacement = False
-            new = l
-            for [before, after] in replacements:
-                new = l.replace(before, after)
-                if new != l:
-                    print(f'Changed line "{l[:-1]}" to "{new[:-1]}"')
-                    anyFixed = True
-                    foundReplacement = True
-                    break
-            assert foundReplacement
-            assert new != l
-            if args.fixFiles:
-                newFile.write(new)
-            continue
-        if args.fixFiles:
-            newFile.write(l)
+    newText = renameText(text, renamePatt, renames)
+    if newText == text:
+        return
 
-    f.close()
+    # Renaming never adds or removes lines.
+    for (l, new) in zip(text.split("\n"), newText.split("\n")):
+        if new != l:
+            print(f'Changed line "{l}" to "{new}"')
 
     if args.fixFiles:
-        newFile.close()
-        if anyFixed:
-            os.rename(tempFileName, fname)
-        else:
-            os.remove(tempFileName)
+        tempFileName = fname + ".intermediate"
+        with open(tempFileName, "w") as newFile:
+            newFile.write(newText)
+        os.rename(tempFileName, fname)
 
 
 def directoryAnalyzer(args):
-  aliasInfo = getAliases()
-  beforeRe = aliasInfo[0]
-  replacements = aliasInfo[1]
+  if args.renamesFile:
+      renames = loadRenames(args.renamesFile)
+  elif args.aliasesFile:
+      with open(args.aliasesFile, "r") as f:
+          renames = getAliases(f.read())
+  else:
+      renames = getAliases(tdAliases)
 
-  for (base, _, files) in os.walk(args.directory):
-      for fileName in files:
-          if not (fileName.endswith('.h') or fileName.endswith('.cpp')):
-              continue
+  for (before, after) in sorted(renames.items(), reverse=True, key=lambda x: len(x[0])):
+      print(f'{before} --> {after}')
 
-          if not base.endswith("/"):
-              base += "/"
-          fullFileName = base + fileName
+  renamePatt = renamesRegexp(renames)
 
-          fileAnalyzer(args, fullFileName, beforeRe, replacements)
+  for (base, fileName, _) in treewalk.files(args, args.directory, ['.h', '.cpp']):
+      fileAnalyzer(args, base + fileName, renamePatt, renames)
 
 
 # Need to run this on js/xpconnect and xpcom/
@@ -135,6 +173,13 @@ parser.add_argument('directory', metavar='D',
 parser.add_argument('--fix', dest='fixFiles', action='store_true',
                     help='Fix any errors that are found')
 
+parser.add_argument('--aliases', dest='aliasesFile', metavar='FILE',
+                    help='Read the TD_ALIAS_ definitions from FILE, such as xptinfo.h, instead of using the built in list')
+parser.add_argument('--renames', dest='renamesFile', metavar='FILE',
+                    help='Read a table of identifiers to rename from FILE instead, with the old and new name on each line')
+
+treewalk.addArguments(parser)
+
 args = parser.parse_args()
 
 directoryAnalyzer(args)
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Tests for decomponents.py. Run with: python3 -m unittest test_decomponents
+
+import re
+import time
+import unittest
+
+import decomponents
+
+# The regexp that scanDestructure replaced.
+fieldPatt = r"\w+\s*:\s*\w+\s*"
+bodyPatt = fieldPatt + r"(?:,\s*" + fieldPatt + r")*"
+destructurePatt = re.compile(r"^(\s*(?:const|let|var))\s*(\{\s*)(" + bodyPatt + r")\}\s*=\s*Components\s*;\s*$")
+
+matchingLines = [
+    "const { utils: Cu, interfaces: Ci, classes: Cc, results: Cr } = Components;\n",
+    "  let {classes: Cc, interfaces: Ci} = Components;\n",
+    "var { utils : Cu } = Components ;  \n",
+    "const {\tutils:Cu,interfaces:Ci }=Components;",
+    "let { utils: Cu, foo: Bar } = Components;\r\n",
+]
+
+nearMissLines = [
+    "",
+    "\n",
+    "const\n",
+    "constant { utils: Cu } = Components;\n",
+    "lets { utils: Cu } = Components;\n",
+    "const { } = Components;\n",
+    "const { utils } = Components;\n",
+    "const { utils: } = Components;\n",
+    "const { : Cu } = Components;\n",
+    "const { utils: Cu, } = Components;\n",
+    "const { utils: Cu,, interfaces: Ci } = Components;\n",
+    "const { utils: Cu interfaces: Ci } = Components;\n",
+    "const { utils: Cu } = Components\n",
+    "const { utils: Cu } = Components; foo();\n",
+    "const { utils: Cu } = Components.utils;\n",
+    "const { utils: Cu } == Components;\n",
+    "const { utils: Cu } Components;\n",
+    "const [ utils: Cu ] = Components;\n",
+    "const { utils: Cu = Components;\n",
+    "// const { utils: Cu } = Components;\n",
+]
+
+
+class ScanDestructureTest(unittest.TestCase):
+    def assertSameAsRegexp(self, l):
+        m = destructurePatt.match(l)
+        expected = m.groups() if m else None
+        self.assertEqual(decomponents.scanDestructure(l), expected, repr(l))
+
+    def test_matching_lines(self):
+        for l in matchingLines:
+            self.assertIsNotNone(decomponents.scanDestructure(l), repr(l))
+            self.assertSameAsRegexp(l)
+
+    def test_near_miss_lines(self):
+        for l in nearMissLines:
+            self.assertSameAsRegexp(l)
+
+    # Every line that is one character away from a matching line.
+    def test_edited_lines(self):
+        for l in matchingLines:
+            for i in range(len(l) + 1):
+                self.assertSameAsRegexp(l[:i] + l[i + 1:])
+                for c in " :,{}=;\nx":
+                    self.assertSameAsRegexp(l[:i] + c + l[i:])
+
+    # A long line of fields that doesn't end like a destructuring line
+    # has to be rejected quickly.
+    def test_long_line(self):
+        l = "const { " + "a: b, " * 17000 + "c: d } = Components.utils;\n"
+        self.assertGreater(len(l), 100000)
+        start = time.monotonic()
+        self.assertIsNone(decomponents.scanDestructure(l))
+        self.assertLess(time.monotonic() - start, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Source tree walker shared by the scripts in this directory.
+
+import os
+import subprocess
+
+
+# Version control directories never contain anything we want to look at.
+vcsDirNames = frozenset(['.git', '.hg'])
+
+# Directories containing imported code.
+thirdPartyDirNames = frozenset(['third_party', 'other-licenses'])
+
+# Directories whose names start with this are objdirs.
+objDirPrefix = 'obj-'
+
+
+# Returns a function that returns the extension in |extensions| that a
+# file name ends with, or None if there isn't one. Extensions can contain
+# more than one dot, like ".sys.mjs", in which case the longest match wins.
+def extensionMatcher(extensions):
+    suffixes = tuple(extensions)
+    longestFirst = sorted(suffixes, key=len, reverse=True)
+
+    def matcher(fileName):
+        # This is a single call into C for the common case of no match.
+        if not fileName.endswith(suffixes):
+            return None
+        for e in longestFirst:
+            if fileName.endswith(e):
+                return e
+
+    return matcher
+
+
+# Walk |directory|, yielding (base, fileName, extension) for every file
+# whose name ends with one of |extensions|. |base| always ends with "/".
+#
+# Objdirs and directories named in |prunedDirNames| are not descended
+# into. If |pruneDir| is given, it is called with the path of each other
+# directory, ending in "/", and that directory is skipped if it returns
+# true. Entries are visited in sorted order, so the output is the same
+# from one run to the next.
+#
+# Symlinks to directories are only followed if |followLinks| is true, in
+# which case directories that have already been visited are skipped, to
+# avoid symlink loops.
+def walk(directory, extensions, pruneDir=None, prunedDirNames=vcsDirNames, followLinks=False):
+    matcher = extensionMatcher(extensions)
+
+    if not directory.endswith("/"):
+        directory += "/"
+    stack = [directory]
+
+    visited = set()
+    if followLinks:
+        st = os.stat(directory)
+        visited.add((st.st_dev, st.st_ino))
+
+    while stack:
+        base = stack.pop()
+        try:
+            with os.scandir(base) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            # Like os.walk, ignore directories we can't list.
+            continue
+
+        subdirs = []
+        for entry in entries:
+            name = entry.name
+            # This uses the type from the directory listing, when there
+            # is one, instead of doing a stat.
+            if entry.is_dir(follow_symlinks=followLinks):
+                if name in prunedDirNames or name.startswith(objDirPrefix):
+                    continue
+                path = base + name + "/"
+                if pruneDir and pruneDir(path):
+                    continue
+                if followLinks:
+                    st = entry.stat()
+                    if (st.st_dev, st.st_ino) in visited:
+                        continue
+                    visited.add((st.st_dev, st.st_ino))
+                subdirs.append(path)
+                continue
+
+            extension = matcher(name)
+            if extension:
+                yield (base, name, extension)
+
+        stack.extend(reversed(subdirs))
+
+
+# The order files are yielded in by walk, for files found some other way.
+def walkOrderKey(path):
+    components = path.split("/")
+    return [(1, c) for c in components[:-1]] + [(0, components[-1])]
+
+
+# Like walk, but only yields files in the git index for |directory|, or
+# if |changedSince| is given, files that have been changed since that
+# revision, including uncommitted changes. This avoids looking at build
+# output and other untracked files entirely, and with |changedSince| it
+# is fast enough for checking a single patch.
+def gitFiles(directory, extensions, pruneDir=None, prunedDirNames=vcsDirNames, changedSince=None):
+    matcher = extensionMatcher(extensions)
+
+    if not directory.endswith("/"):
+        directory += "/"
+
+    if changedSince:
+        command = ["git", "-C", directory, "diff", "--name-only", "-z", "--relative",
+                   "--diff-filter=d", changedSince, "--"]
+    else:
+        command = ["git", "-C", directory, "ls-files", "-z", "--"]
+    command += ["*" + e for e in extensions]
+    output = subprocess.run(command, stdout=subprocess.PIPE, check=True).stdout
+    paths = [os.fsdecode(p) for p in output.split(b"\0") if p]
+
+    # Directories are checked once each, and only if their parent wasn't
+    # pruned, the same as when walking.
+    pruned = {directory: False}
+    def isPruned(base):
+        if base not in pruned:
+            (parent, name) = base[:-1].rsplit("/", 1)
+            pruned[base] = (isPruned(parent + "/") or name in prunedDirNames or
+                            name.startswith(objDirPrefix) or
+                            bool(pruneDir and pruneDir(base)))
+        return pruned[base]
+
+    for path in sorted(set(paths), key=walkOrderKey):
+        (base, _, fileName) = (directory + path).rpartition("/")
+        base += "/"
+        extension = matcher(fileName)
+        if not extension or isPruned(base):
+            continue
+        # The index can contain files that have been deleted locally.
+        if not os.path.lexists(base + fileName):
+            continue
+        yield (base, fileName, extension)
+
+
+def addArguments(parser):
+    parser.add_argument('--git', dest='useGit', action='store_true',
+                        help='Only look at files in the git index, instead of walking the directory')
+    parser.add_argument('--changed-since', dest='changedSince', metavar='REV',
+                        help='Only look at files that have changed since git revision REV')
+
+
+# Find files using walk or gitFiles, depending on the arguments added by
+# addArguments.
+def files(args, directory, extensions, pruneDir=None, prunedDirNames=vcsDirNames):
+    if args.useGit or args.changedSince:
+        return gitFiles(directory, extensions, pruneDir, prunedDirNames, args.changedSince)
+    return walk(directory, extensions, pruneDir, prunedDirNames)
@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
@@ -10,6 +10,8 @@ import re
 import os
 import argparse
 
+import treewalk
+
 
 lsanAllowedPatt = re.compile("^lsan-allowed: \[(.*)\]")
 
@@ -36,10 +38,10 @@ ignorelistedDirectories = [
 
 
 def fileAnalyzer(args, fname):
-    f = open(fname, "r")
+    f = open(fname, "r", encoding="latin-1")
 
     if args.fixFiles:
-        newFile = open(fname + ".intermediate", "w")
+        newFile = open(fname + ".intermediate", "w", encoding="latin-1")
 
     for l in f:
         m = lsanAllowedPatt.match(l)
@@ -79,6 +81,8 @@ parser.add_argument('directory', metavar='D',
 parser.add_argument('--fix', dest='fixFiles', action='store_true',
                     help='Fix any errors that are found')
 
+treewalk.addArguments(parser)
+
 args = parser.parse_args()
 
 ignorelist = []
@@ -96,15 +100,12 @@ ignorelistedDirPatt = re.compile('^{base}{wpt}(?:{dirs})$'.format(base = re.esca
                                                                   dirs = "|".join(["/" + re.escape(s) for s in ignorelistedDirectories])))
 
 
-for (base, _, files) in os.walk(directory):
-    if not iniFileName in files:
+for (base, fileName, _) in treewalk.files(args, directory, ['.ini']):
+    if fileName != iniFileName:
         continue
 
-    if not base.endswith("/"):
-        base += "/"
-
     if ignorelistedDirPatt.match(base):
-        print 'Skipping ignore listed file in', base
+        print('Skipping ignore listed file in', base)
         continue
 
     fullFileName = base + iniFileName